@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 {
     'name': 'SDV - Recepción por Piezas',
-    'version': '1.0',
+    'version': '1.1',
     'summary': 'Recepción de materias primas en m² creando piezas (lotes) con dimensiones',
     'author': 'SmallDev',
     'website': 'https://smalldev.es',
@@ -15,8 +15,14 @@
     ],
     'data': [
         'security/ir.model.access.csv',
+        'security/marble_security.xml',
+        'data/ir_cron_data.xml',
         'views/stock_picking_views.xml',
+        'views/product_template_views.xml',
+        'views/stock_lot_views.xml',
         'views/marble_receive_wizard_views.xml',
+        'views/marble_receive_run_views.xml',
+        'views/marble_stock_m2_report_views.xml',
     ],
     'installable': True,
 }
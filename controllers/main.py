@@ -0,0 +1,23 @@
+from odoo import http
+from odoo.http import request
+
+
+class MarbleReceiveController(http.Controller):
+
+    @http.route('/sdv_marble_receive/pieces', type='json', auth='user', methods=['POST'])
+    def receive_pieces(self, batch_id, picking_id, move_line_id, pieces, run_async=False, **kwargs):
+        """
+        Recepción de piezas medidas por lotes (estación de medida, escáner...).
+
+        Parámetros JSON-RPC:
+            batch_id: identificador único del lote; reenviarlo no duplica piezas. Para
+                enviar una recepción por partes, cada parte lleva su propio identificador.
+            picking_id, move_line_id: recepción y línea del producto base.
+            pieces: [{'ancho': cm, 'alto': cm, 'grosor': cm, 'qty': piezas (1)}, ...]
+            run_async: procesar en segundo plano aunque no se supere el umbral.
+
+        Devuelve el estado del lote con los productos hijo y las move lines creadas.
+        """
+        return request.env['sdv.marble.receive.job'].ingest_batch(
+            batch_id, picking_id, move_line_id, pieces, run_async=run_async,
+        )
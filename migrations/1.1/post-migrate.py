@@ -0,0 +1,7 @@
+from odoo import api, SUPERUSER_ID
+
+
+def migrate(cr, version):
+    # Los hijos creados antes de la clave de medidas se resolvían por nombre: se les asigna la clave
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env['product.template']._backfill_child_measure_keys()
@@ -1,3 +1,3 @@
 # -*- coding: utf-8 -*-
 
-from . import stock_picking, stock_move
+from . import stock_picking, stock_move, stock_lot, product_template, product_product, receive_run, receive_job, stock_m2_report, slab_index
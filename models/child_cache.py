@@ -0,0 +1,120 @@
+import threading
+
+from odoo.tools.lru import LRU
+
+# Entradas máximas por base de datos
+CHILD_CACHE_SIZE = 4096
+
+# Secuencia de PostgreSQL que señaliza la invalidación de la caché entre workers
+CHILD_CACHE_SEQUENCE = 'sdv_marble_child_cache_seq'
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+class ChildProductCache:
+    """
+    Caché LRU por proceso y base de datos de productos hijo ya resueltos:
+    (compañía, producto base, clave de medidas) -> id de product.product.
+
+    Se invalida con una secuencia propia (``CHILD_CACHE_SEQUENCE``), sin tocar las
+    cachés del registro: al confirmar una transacción que modifica, archiva o borra
+    un hijo se incrementa la secuencia, y cada transacción que consulta la caché lee
+    su valor una vez y vacía la caché local si ha cambiado. Las entradas no se
+    vuelven a validar contra la tabla. Las entradas nuevas se añaden tras el commit
+    para no guardar ids de transacciones deshechas.
+    """
+
+    def __init__(self, size=CHILD_CACHE_SIZE):
+        self._lru = LRU(size)
+        self._sequence = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _check_sequence(self, sequence):
+        if sequence != self._sequence:
+            self._lru.clear()
+            self._sequence = sequence
+
+    def get_many(self, env, keys):
+        """Devuelve {clave: product_id} para las claves en caché y actualiza los contadores."""
+        sequence = _get_sequence(env)
+        found = {}
+        with self._lock:
+            self._check_sequence(sequence)
+            for key in keys:
+                product_id = self._lru.get(key)
+                if product_id:
+                    found[key] = product_id
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items, sequence):
+        """Guarda ``items`` leídos con la secuencia ``sequence``; se descartan si ya ha cambiado."""
+        with self._lock:
+            if sequence != self._sequence:
+                return
+            for key, product_id in items.items():
+                self._lru[key] = product_id
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._lru), 'hits': self.hits, 'misses': self.misses}
+
+
+def create_child_cache_sequence(cr):
+    cr.execute("CREATE SEQUENCE IF NOT EXISTS %s" % CHILD_CACHE_SEQUENCE)
+
+
+def _get_sequence(env):
+    """Valor de la secuencia de invalidación, leído una sola vez por transacción."""
+    data = env.cr.postcommit.data
+    if CHILD_CACHE_SEQUENCE not in data:
+        # Las secuencias no son transaccionales: se lee el valor actual, no el de la instantánea
+        env.cr.execute("SELECT last_value, is_called FROM %s" % CHILD_CACHE_SEQUENCE)
+        data[CHILD_CACHE_SEQUENCE] = env.cr.fetchone()
+    return data[CHILD_CACHE_SEQUENCE]
+
+
+def get_child_cache(env):
+    dbname = env.cr.dbname
+    cache = _caches.get(dbname)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.setdefault(dbname, ChildProductCache())
+    return cache
+
+
+def cache_children_after_commit(env, items):
+    """Guarda ``items`` ({clave: product_id}) en la caché cuando se confirme la transacción."""
+    if items:
+        cache = get_child_cache(env)
+        sequence = _get_sequence(env)
+        env.cr.postcommit.add(lambda: cache.put_many(items, sequence))
+
+
+def invalidate_child_cache(env):
+    """
+    Vacía la caché local y, cuando se confirme la transacción, incrementa la secuencia
+    para que el resto de workers vacíe la suya (una sola vez por transacción).
+    """
+    cache = get_child_cache(env)
+    cache.clear()
+    data = env.cr.postcommit.data
+    if data.get('sdv_marble_child_cache.invalidated'):
+        return
+    data['sdv_marble_child_cache.invalidated'] = True
+    registry = env.registry
+
+    def signal():
+        cache.clear()
+        with registry.cursor() as cr:
+            cr.execute("SELECT nextval('%s')" % CHILD_CACHE_SEQUENCE)
+
+    env.cr.postcommit.add(signal)
@@ -0,0 +1,47 @@
+from odoo import models, fields, api
+
+from .child_cache import invalidate_child_cache
+
+MEASURE_FIELDS = ('x_ancho', 'x_alto', 'x_grosor')
+
+# Campos de la variante cuyo cambio invalida la caché de productos hijo
+CHILD_CACHE_FIELDS = {'active', 'company_id', 'product_tmpl_id', 'product_template_attribute_value_ids'}
+
+
+class ProductProduct(models.Model):
+    _inherit = 'product.product'
+
+    # Producto "base" (padre): sin medidas y no generado como hijo de otro producto.
+    # Almacenado e indexado para filtrar las líneas de recepción con un dominio.
+    x_is_base_product = fields.Boolean(
+        string='Es producto base',
+        compute='_compute_x_is_base_product',
+        store=True,
+        index=True,
+    )
+
+    @api.depends(lambda self: ['product_tmpl_id.x_measure_base_tmpl_id']
+                 + [f for f in MEASURE_FIELDS if f in self._fields])
+    def _compute_x_is_base_product(self):
+        has_measure_fields = set(MEASURE_FIELDS) <= set(self._fields)
+        for product in self:
+            if product.product_tmpl_id.x_measure_base_tmpl_id:
+                product.x_is_base_product = False
+            elif not has_measure_fields:
+                product.x_is_base_product = True
+            else:
+                # Si todas las medidas son 0, es un producto base
+                product.x_is_base_product = all((product[f] or 0.0) <= 0 for f in MEASURE_FIELDS)
+
+    def write(self, vals):
+        res = super().write(vals)
+        if CHILD_CACHE_FIELDS & set(vals) and self.filtered('product_tmpl_id.x_measure_key'):
+            invalidate_child_cache(self.env)
+        return res
+
+    def unlink(self):
+        children = self.filtered('product_tmpl_id.x_measure_key')
+        res = super().unlink()
+        if children:
+            invalidate_child_cache(self.env)
+        return res
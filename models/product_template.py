@@ -0,0 +1,277 @@
+import logging
+import re
+
+from odoo import models, fields, api, _
+from odoo.exceptions import ValidationError
+
+from .child_cache import create_child_cache_sequence, get_child_cache, invalidate_child_cache
+
+_logger = logging.getLogger(__name__)
+
+# Campos cuyo cambio invalida la caché de productos hijo
+CHILD_CACHE_FIELDS = {'active', 'company_id', 'x_measure_key', 'x_measure_base_tmpl_id'}
+
+# Nombre maquetado de los hijos creados antes de la clave de medidas: "<base> – AxBxG cm"
+LEGACY_CHILD_NAME_RE = re.compile(r'^(?P<base>.+) – (?P<ancho>[\d.]+)x(?P<alto>[\d.]+)x(?P<grosor>[\d.]+) cm$')
+
+# Limpieza de productos hijo sin uso: días sin movimientos y plantillas por bloque
+CHILD_GC_RETENTION_DAYS = 180
+CHILD_GC_CHUNK_SIZE = 1000
+
+
+class ProductTemplate(models.Model):
+    _inherit = 'product.template'
+
+    # Un único hijo por plantilla base, compañía y medidas redondeadas (todas en la clave)
+    _sql_constraints = [
+        ('x_measure_key_uniq', 'unique(x_measure_key)',
+         "Ya existe un producto hijo con estas medidas para el producto base."),
+    ]
+
+    # Hijos generados por la recepción por piezas: plantilla base de la que
+    # proceden y clave de medidas indexada para resolverlos sin buscar por nombre.
+    x_measure_base_tmpl_id = fields.Many2one(
+        'product.template',
+        string='Producto base (medidas)',
+        index=True,
+        copy=False,
+        ondelete='set null',
+    )
+    x_measure_key = fields.Char(
+        string='Clave de medidas',
+        index=True,
+        copy=False,
+        readonly=True,
+        help="Plantilla base, compañía y medidas redondeadas del producto hijo.",
+    )
+
+    # Cómo se registran las piezas de este producto base en la recepción
+    x_receive_mode = fields.Selection(
+        [
+            ('product', 'Producto por medida'),
+            ('lot', 'Lote por pieza'),
+        ],
+        string='Recepción por piezas',
+        default='product',
+        required=True,
+        help="Producto por medida: cada medida distinta crea un producto hijo.\n"
+             "Lote por pieza: el producto base se sigue por lotes y cada pieza es un lote "
+             "con sus medidas, sin crear productos nuevos.",
+    )
+
+    def init(self):
+        super().init()
+        create_child_cache_sequence(self.env.cr)
+
+    @api.constrains('x_receive_mode', 'tracking')
+    def _check_x_receive_mode(self):
+        for tmpl in self:
+            if tmpl.x_receive_mode == 'lot' and tmpl.tracking != 'lot':
+                raise ValidationError(_(
+                    "El producto '%s' se recibe con un lote por pieza: debe tener seguimiento por lotes."
+                ) % tmpl.display_name)
+
+    def _get_child_measure_key(self, ancho_cm, alto_cm, grosor_cm):
+        """
+        Clave de un producto hijo de esta plantilla base con las medidas dadas.
+        Formato: ``<plantilla base>|<compañía>|<ancho>|<alto>|<grosor>``.
+        """
+        self.ensure_one()
+        return "%s|%s|%.2f|%.2f|%.2f" % (
+            self.id,
+            self.company_id.id or 0,
+            round(ancho_cm or 0.0, 2),
+            round(alto_cm or 0.0, 2),
+            round(grosor_cm or 0.0, 2),
+        )
+
+    def write(self, vals):
+        res = super().write(vals)
+        if CHILD_CACHE_FIELDS & set(vals) and ('x_measure_key' in vals or self.filtered('x_measure_key')):
+            invalidate_child_cache(self.env)
+        return res
+
+    def unlink(self):
+        children = self.filtered('x_measure_key')
+        res = super().unlink()
+        if children:
+            invalidate_child_cache(self.env)
+        return res
+
+    @api.model
+    def get_child_cache_stats(self):
+        """Aciertos, fallos y tamaño de la caché de productos hijo de este proceso."""
+        return get_child_cache(self.env).stats()
+
+    # ----------------- Clave de medidas de hijos antiguos -----------------
+
+    @api.model
+    def _backfill_child_measure_keys(self):
+        """
+        Asigna plantilla base y clave de medidas a los hijos creados antes de que existiera
+        la clave, reconociéndolos por su nombre maquetado. Se ejecuta una vez al migrar el
+        módulo: la recepción solo resuelve hijos por la clave. Si hay varios hijos para la
+        misma clave se queda el más antiguo; el resto se deja sin clave y se avisa en el log.
+        """
+        Template = self.sudo().with_context(active_test=False)
+        candidates = Template.search([
+            ('x_measure_key', '=', False),
+            ('name', '=like', '% – %x%x% cm'),
+        ], order='id')
+        parsed = {}
+        for tmpl in candidates:
+            match = LEGACY_CHILD_NAME_RE.match(tmpl.name or '')
+            if match:
+                parsed[tmpl] = match
+        if not parsed:
+            return 0
+
+        bases = Template.search([
+            ('x_measure_key', '=', False),
+            ('name', 'in', list({match['base'] for match in parsed.values()})),
+        ], order='id')
+        base_by_name = {}
+        for base in bases:
+            base_by_name.setdefault((base.name, base.company_id.id), base)
+        has_measure_fields = {'x_ancho', 'x_alto', 'x_grosor'} <= set(Template._fields)
+        used_keys = set(Template.search([('x_measure_key', '!=', False)]).mapped('x_measure_key'))
+
+        backfilled = 0
+        for tmpl, match in parsed.items():
+            base = base_by_name.get((match['base'], tmpl.company_id.id))
+            if not base or base == tmpl:
+                continue
+            measures = tuple(round(float(match[f]), 2) for f in ('ancho', 'alto', 'grosor'))
+            if has_measure_fields and measures != (
+                round(tmpl.x_ancho or 0.0, 2), round(tmpl.x_alto or 0.0, 2), round(tmpl.x_grosor or 0.0, 2),
+            ):
+                continue
+            key = base._get_child_measure_key(*measures)
+            if key in used_keys:
+                _logger.warning(
+                    "Producto hijo %s (%s) duplicado de la clave %s: se deja sin clave", tmpl.id, tmpl.name, key,
+                )
+                continue
+            tmpl.write({'x_measure_base_tmpl_id': base.id, 'x_measure_key': key})
+            used_keys.add(key)
+            backfilled += 1
+
+        _logger.info("Clave de medidas asignada a %s productos hijo existentes", backfilled)
+        return backfilled
+
+    # ----------------- Limpieza de productos hijo -----------------
+
+    def _get_child_gc_candidates(self, cutoff, last_id, limit):
+        """
+        Hijos activos creados antes de ``cutoff`` sin stock en ubicaciones internas o de
+        tránsito, sin movimientos abiertos y sin movimientos posteriores a ``cutoff``.
+        """
+        self.env.cr.execute("""
+            SELECT tmpl.id
+              FROM product_template tmpl
+             WHERE tmpl.x_measure_key IS NOT NULL
+               AND tmpl.active
+               AND tmpl.create_date < %(cutoff)s
+               AND tmpl.id > %(last_id)s
+               AND NOT EXISTS (
+                    SELECT 1
+                      FROM product_product prod
+                      JOIN stock_quant q ON q.product_id = prod.id
+                      JOIN stock_location loc ON loc.id = q.location_id
+                     WHERE prod.product_tmpl_id = tmpl.id
+                       AND loc.usage IN ('internal', 'transit')
+                       AND q.quantity != 0)
+               AND NOT EXISTS (
+                    SELECT 1
+                      FROM product_product prod
+                      JOIN stock_move m ON m.product_id = prod.id
+                     WHERE prod.product_tmpl_id = tmpl.id
+                       AND (m.state NOT IN ('done', 'cancel') OR m.date >= %(cutoff)s))
+          ORDER BY tmpl.id
+             LIMIT %(limit)s
+        """, {'cutoff': cutoff, 'last_id': last_id, 'limit': limit})
+        return [row[0] for row in self.env.cr.fetchall()]
+
+    def _get_child_gc_unlink_candidates(self, last_id, limit):
+        """Hijos archivados que nunca han tenido movimientos ni stock: se pueden borrar."""
+        self.env.cr.execute("""
+            SELECT tmpl.id
+              FROM product_template tmpl
+             WHERE tmpl.x_measure_key IS NOT NULL
+               AND NOT tmpl.active
+               AND tmpl.id > %(last_id)s
+               AND NOT EXISTS (
+                    SELECT 1
+                      FROM product_product prod
+                     WHERE prod.product_tmpl_id = tmpl.id
+                       AND (EXISTS (SELECT 1 FROM stock_move m WHERE m.product_id = prod.id)
+                            OR EXISTS (SELECT 1 FROM stock_quant q WHERE q.product_id = prod.id)))
+          ORDER BY tmpl.id
+             LIMIT %(limit)s
+        """, {'last_id': last_id, 'limit': limit})
+        return [row[0] for row in self.env.cr.fetchall()]
+
+    def _unlink_child_chunk(self):
+        """Borra el bloque; si algo lo referencia (compras, ventas...) se borra uno a uno."""
+        try:
+            with self.env.cr.savepoint():
+                self.with_context(active_test=False).unlink()
+            return len(self)
+        except Exception:
+            self.env.invalidate_all(flush=False)
+        deleted = 0
+        for tmpl in self:
+            try:
+                with self.env.cr.savepoint():
+                    tmpl.with_context(active_test=False).unlink()
+                deleted += 1
+            except Exception:
+                self.env.invalidate_all(flush=False)
+                _logger.debug("Producto hijo %s en uso: se mantiene archivado", tmpl.id)
+        return deleted
+
+    @api.model
+    def _cron_gc_child_products(self):
+        """
+        Archiva los productos hijo sin stock ni movimientos durante el periodo de retención
+        y, si está activado, borra los archivados que nunca se han usado. Trabaja por
+        bloques confirmados. Un hijo archivado se reactiva en la siguiente recepción de
+        esas medidas y uno borrado se vuelve a crear: ambos se resuelven por su clave.
+        """
+        params = self.env['ir.config_parameter'].sudo()
+        days = int(params.get_param('sdv_marble_receive.child_gc_days', CHILD_GC_RETENTION_DAYS))
+        if days <= 0:
+            return {'archived': 0, 'deleted': 0}
+        chunk_size = int(params.get_param(
+            'sdv_marble_receive.child_gc_chunk_size', CHILD_GC_CHUNK_SIZE
+        )) or CHILD_GC_CHUNK_SIZE
+        cutoff = fields.Datetime.subtract(fields.Datetime.now(), days=days)
+        Template = self.sudo().with_context(active_test=False)
+
+        archived = 0
+        last_id = 0
+        while True:
+            ids = Template._get_child_gc_candidates(cutoff, last_id, chunk_size)
+            if not ids:
+                break
+            Template.browse(ids).write({'active': False})
+            archived += len(ids)
+            last_id = ids[-1]
+            self.env.cr.commit()
+
+        deleted = 0
+        if params.get_param('sdv_marble_receive.child_gc_unlink'):
+            last_id = 0
+            while True:
+                ids = Template._get_child_gc_unlink_candidates(last_id, chunk_size)
+                if not ids:
+                    break
+                deleted += Template.browse(ids)._unlink_child_chunk()
+                last_id = ids[-1]
+                self.env.cr.commit()
+
+        _logger.info(
+            "Limpieza de productos hijo: %s archivados y %s borrados (sin uso desde %s)",
+            archived, deleted, cutoff,
+        )
+        return {'archived': archived, 'deleted': deleted}
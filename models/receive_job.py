@@ -0,0 +1,266 @@
+import logging
+from collections import Counter
+
+from psycopg2.errors import SerializationFailure, UniqueViolation
+
+from odoo import models, fields, api, Command, _
+from odoo.exceptions import ConcurrencyError, UserError, ValidationError
+
+from .receive_run import ReceiveInstrumentation, receive_phase, INSTRUMENTATION_CONTEXT_KEY
+
+_logger = logging.getLogger(__name__)
+
+# Medidas distintas que se procesan en cada bloque confirmado
+# (parámetro de sistema ``sdv_marble_receive.async_chunk_size``)
+JOB_CHUNK_SIZE = 20
+
+
+class MarbleReceiveJob(models.Model):
+    _name = 'sdv.marble.receive.job'
+    _description = 'Recepción de mármol en segundo plano'
+    _order = 'id'
+
+    # Una sola tarea por lote recibido por la API: reenviar un lote no duplica piezas
+    _sql_constraints = [
+        ('batch_ref_uniq', 'unique(batch_ref)', "Ya existe una recepción con este identificador de lote."),
+    ]
+
+    picking_id = fields.Many2one('stock.picking', required=True, index=True, ondelete='cascade')
+    company_id = fields.Many2one(related='picking_id.company_id', store=True)
+    # El move base se guarda aparte: la línea de recepción puede eliminarse al reducir la demanda
+    move_id = fields.Many2one('stock.move', string='Movimiento base', required=True, ondelete='cascade')
+    product_id = fields.Many2one('product.product', string='Producto base', required=True)
+    line_ids = fields.One2many('sdv.marble.receive.job.line', 'job_id', string='Medidas')
+    batch_ref = fields.Char(string='Lote de la API', index=True, copy=False, readonly=True)
+    move_line_ids = fields.Many2many('stock.move.line', string='Piezas creadas', copy=False, readonly=True)
+
+    state = fields.Selection([
+        ('pending', 'Pendiente'),
+        ('running', 'En curso'),
+        ('done', 'Hecho'),
+        ('failed', 'Error'),
+    ], string='Estado', default='pending', required=True, index=True)
+    groups_total = fields.Integer(string='Medidas totales')
+    groups_done = fields.Integer(string='Medidas procesadas')
+    pieces_total = fields.Integer(string='Piezas totales')
+    pieces_created = fields.Integer(string='Piezas creadas')
+    error_message = fields.Text(string='Error', readonly=True)
+
+    @api.model
+    def create_from_quantities(self, base_move_line, quantities, batch_ref=False, trigger=True):
+        """Crea y lanza la tarea para ``quantities`` ({(ancho, alto, grosor): piezas})."""
+        job = self.create({
+            'batch_ref': batch_ref,
+            'picking_id': base_move_line.picking_id.id,
+            'move_id': base_move_line.move_id.id,
+            'product_id': base_move_line.product_id.id,
+            'groups_total': len(quantities),
+            'pieces_total': sum(quantities.values()),
+            'line_ids': [(0, 0, {
+                'x_ancho_cm': ancho,
+                'x_alto_cm': alto,
+                'x_grosor_cm': grosor,
+                'x_qty': qty,
+            }) for (ancho, alto, grosor), qty in quantities.items()],
+        })
+        if trigger:
+            self._get_cron()._trigger()
+        return job
+
+    def action_retry(self):
+        failed = self.filtered(lambda j: j.state == 'failed')
+        if not failed:
+            raise UserError(_("Solo se pueden reintentar recepciones con error."))
+        failed.write({'state': 'pending', 'error_message': False})
+        self._get_cron()._trigger()
+
+    def _get_cron(self):
+        return self.env.ref('%s.ir_cron_marble_receive_jobs' % self._module)
+
+    @api.model
+    def _cron_process_jobs(self):
+        # Las tareas 'running' son las interrumpidas: se retoman desde el último bloque confirmado
+        for job in self.search([('state', 'in', ('pending', 'running'))]):
+            job._process()
+
+    def _get_chunk_size(self):
+        return int(self.env['ir.config_parameter'].sudo().get_param(
+            'sdv_marble_receive.async_chunk_size', JOB_CHUNK_SIZE
+        )) or JOB_CHUNK_SIZE
+
+    def _get_instrumented_wizard(self, mode):
+        instrumentation = ReceiveInstrumentation(self.env, self.picking_id, mode)
+        Wizard = self.env['sdv.marble.receive.wizard'].with_context(**{INSTRUMENTATION_CONTEXT_KEY: instrumentation})
+        return Wizard, instrumentation
+
+    def _process_lines(self, Wizard, lines):
+        """Genera las piezas de ``lines`` y las marca como hechas junto con el progreso."""
+        quantities = {
+            (round(line.x_ancho_cm, 2), round(line.x_alto_cm, 2), round(line.x_grosor_cm, 2)): line.x_qty
+            for line in lines
+        }
+        move_lines = Wizard._generate_pieces(self.picking_id, self.move_id, self.product_id, quantities)
+        lines.write({'done': True})
+        self.write({
+            'move_line_ids': [Command.link(move_line_id) for move_line_id in move_lines.ids],
+            'groups_done': self.groups_done + len(lines),
+            'pieces_created': self.pieces_created + sum(lines.mapped('x_qty')),
+        })
+
+    def _finish(self, Wizard, instrumentation, groups_start, pieces_start):
+        with receive_phase(Wizard.env, 'base_move'):
+            Wizard._reduce_base_move_demand(self.move_id, self.pieces_total)
+        self.state = 'done'
+        instrumentation.finish(
+            pieces=self.pieces_created - pieces_start,
+            groups=self.groups_done - groups_start,
+        )
+
+    def _process(self):
+        """
+        Procesa la tarea por bloques de medidas, confirmando cada bloque junto con el
+        progreso. Los productos hijo se resuelven por su clave de medidas y las medidas
+        se marcan como hechas en la misma transacción que sus moves, de modo que un
+        reintento no duplica productos ni movimientos.
+        """
+        self.ensure_one()
+        Wizard, instrumentation = self._get_instrumented_wizard('async')
+        chunk_size = self._get_chunk_size()
+        groups_start, pieces_start = self.groups_done, self.pieces_created
+        try:
+            self.state = 'running'
+            self.env.cr.commit()
+
+            while True:
+                lines = self.line_ids.filtered(lambda l: not l.done)[:chunk_size]
+                if not lines:
+                    break
+                self._process_lines(Wizard, lines)
+                self.env.cr.commit()
+
+            self._finish(Wizard, instrumentation, groups_start, pieces_start)
+            self.env.cr.commit()
+        except (SerializationFailure, ConcurrencyError):
+            # Conflicto con otra recepción concurrente: se retoma en la siguiente ejecución
+            self.env.cr.rollback()
+            self.env.invalidate_all(flush=False)
+            _logger.info("Recepción por piezas %s en conflicto con otra recepción; se reintentará", self.id)
+            self._get_cron()._trigger()
+        except Exception as e:
+            self.env.cr.rollback()
+            self.env.invalidate_all(flush=False)
+            _logger.exception("Error procesando la recepción por piezas %s (%s)", self.id, self.picking_id.name)
+            self.write({'state': 'failed', 'error_message': str(e)})
+            self.env.cr.commit()
+
+    def _process_sync(self):
+        """
+        Procesa la tarea entera en la transacción en curso, sin confirmar bloques: la
+        petición que la lanza decide. Un error deshace piezas y tarea juntas, y un
+        conflicto de concurrencia hace que Odoo reintente la petición completa.
+        """
+        self.ensure_one()
+        Wizard, instrumentation = self._get_instrumented_wizard('sync')
+        groups_start, pieces_start = self.groups_done, self.pieces_created
+        self.state = 'running'
+        self._process_lines(Wizard, self.line_ids.filtered(lambda l: not l.done))
+        self._finish(Wizard, instrumentation, groups_start, pieces_start)
+
+    # ----------------- API de recepción por lotes -----------------
+
+    @api.model
+    def _get_batch_quantities(self, pieces):
+        """
+        Agrupa las piezas recibidas por la API por medidas redondeadas.
+
+        :param pieces: lista de {'ancho', 'alto', 'grosor', 'qty' (opcional, 1)} en cm
+        :return: Counter {(ancho, alto, grosor): piezas}
+        """
+        if not pieces or not isinstance(pieces, list):
+            raise ValidationError(_("El lote no contiene piezas."))
+        quantities = Counter()
+        for index, piece in enumerate(pieces, start=1):
+            try:
+                ancho = round(float(piece['ancho']), 2)
+                alto = round(float(piece['alto']), 2)
+                grosor = round(float(piece['grosor']), 2)
+                qty = int(piece.get('qty', 1))
+            except (KeyError, TypeError, ValueError, AttributeError):
+                raise ValidationError(_("Pieza %s: se esperan 'ancho', 'alto', 'grosor' y 'qty' numéricos.") % index)
+            if ancho <= 0 or alto <= 0 or grosor <= 0 or qty <= 0:
+                raise ValidationError(_("Pieza %s: medidas y número de piezas deben ser mayores que 0.") % index)
+            quantities[(ancho, alto, grosor)] += qty
+        return quantities
+
+    @api.model
+    def ingest_batch(self, batch_ref, picking_id, move_line_id, pieces, run_async=False):
+        """
+        Registra un lote de piezas medidas (estación de medida, escáner...) con la misma
+        lógica que el asistente, sin pasar por el formulario. Es idempotente por
+        ``batch_ref``: reenviar un lote devuelve su resultado y, si falló en segundo plano,
+        lo retoma desde el último bloque confirmado. Los lotes pequeños se procesan en la
+        propia petición, sin confirmaciones intermedias; los grandes, en segundo plano, y
+        su resultado se consulta reenviando el mismo lote.
+
+        :return: ver :meth:`_get_batch_result`
+        """
+        if not batch_ref:
+            raise ValidationError(_("El lote debe tener un identificador."))
+        job = self.search([('batch_ref', '=', batch_ref)], limit=1)
+        if job:
+            if job.state == 'failed':
+                job.write({'state': 'pending', 'error_message': False})
+                job._run_batch(run_async)
+            return job._get_batch_result()
+
+        base_move_line = self.env['stock.move.line'].browse(move_line_id).exists()
+        if not base_move_line or base_move_line.picking_id.id != picking_id:
+            raise UserError(_("La línea de recepción %s no pertenece a la recepción %s.") % (move_line_id, picking_id))
+        if base_move_line.picking_id.state in ('cancel', 'done') or not base_move_line.product_id.x_is_base_product:
+            raise UserError(_("La línea %s no admite el registro de piezas.") % base_move_line.display_name)
+        quantities = self._get_batch_quantities(pieces)
+
+        try:
+            with self.env.cr.savepoint():
+                job = self.create_from_quantities(base_move_line, quantities, batch_ref=batch_ref, trigger=False)
+        except UniqueViolation:
+            # El mismo lote ha llegado a la vez por otra petición: se reintenta y se devuelve su resultado
+            raise ConcurrencyError("Lote %s recibido por una petición concurrente" % batch_ref)
+
+        pieces_total = sum(quantities.values())
+        run_async = run_async or self.env['sdv.marble.receive.wizard']._use_async_generation(pieces_total)
+        job._run_batch(run_async)
+        return job._get_batch_result()
+
+    def _run_batch(self, run_async):
+        self.ensure_one()
+        if run_async:
+            self._get_cron()._trigger()
+        else:
+            self._process_sync()
+
+    def _get_batch_result(self):
+        """Estado del lote y productos hijo / move lines creados hasta el momento."""
+        self.ensure_one()
+        return {
+            'batch_id': self.batch_ref,
+            'job_id': self.id,
+            'state': self.state,
+            'pieces_total': self.pieces_total,
+            'pieces_created': self.pieces_created,
+            'product_ids': self.move_line_ids.product_id.ids,
+            'move_line_ids': self.move_line_ids.ids,
+            'error': self.error_message or False,
+        }
+
+
+class MarbleReceiveJobLine(models.Model):
+    _name = 'sdv.marble.receive.job.line'
+    _description = 'Medida de recepción en segundo plano'
+
+    job_id = fields.Many2one('sdv.marble.receive.job', required=True, index=True, ondelete='cascade')
+    x_ancho_cm = fields.Float(string='Ancho (cm)', digits=(10, 2))
+    x_alto_cm = fields.Float(string='Alto (cm)', digits=(10, 2))
+    x_grosor_cm = fields.Float(string='Grosor (cm)', digits=(10, 2))
+    x_qty = fields.Integer(string='Piezas')
+    done = fields.Boolean(string='Procesada', index=True)
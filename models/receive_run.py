@@ -0,0 +1,125 @@
+import logging
+import time
+from contextlib import contextmanager, nullcontext
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+# Clave de contexto con la instrumentación de la recepción en curso
+INSTRUMENTATION_CONTEXT_KEY = 'sdv_receive_instrumentation'
+
+
+def receive_phase(env, name):
+    """Context manager que mide la fase ``name`` si hay una recepción instrumentada."""
+    instrumentation = env.context.get(INSTRUMENTATION_CONTEXT_KEY)
+    return instrumentation.phase(name) if instrumentation else nullcontext()
+
+
+def receive_count(env, name, value=1):
+    """Suma ``value`` al contador ``name`` de la recepción instrumentada, si la hay."""
+    instrumentation = env.context.get(INSTRUMENTATION_CONTEXT_KEY)
+    if instrumentation:
+        instrumentation.counters[name] = instrumentation.counters.get(name, 0) + value
+
+
+class ReceiveInstrumentation:
+    """
+    Tiempo de reloj y número de consultas SQL por fase de una recepción por piezas.
+    Se propaga por el contexto (``with_context(sdv_receive_instrumentation=...)``);
+    al terminar se escribe en el log y, si está activado, en ``sdv.marble.receive.run``.
+    """
+
+    def __init__(self, env, pickings, mode):
+        self.env = env
+        # Una recepción por piezas puede abarcar varios pickings
+        self.pickings = pickings
+        self.names = ", ".join(pickings.mapped('name'))
+        self.mode = mode
+        self.phases = {}
+        self.counters = {}
+        self._start = time.perf_counter()
+        self._start_queries = env.cr.sql_log_count
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        start_queries = self.env.cr.sql_log_count
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            queries = self.env.cr.sql_log_count - start_queries
+            totals = self.phases.setdefault(name, [0.0, 0])
+            totals[0] += duration
+            totals[1] += queries
+            _logger.debug("Recepción %s: fase %s %.3fs, %s consultas", self.names, name, duration, queries)
+
+    def finish(self, pieces, groups):
+        duration = time.perf_counter() - self._start
+        queries = self.env.cr.sql_log_count - self._start_queries
+        products_created = self.counters.get('products_created', 0)
+
+        params = self.env['ir.config_parameter'].sudo()
+        slow_seconds = float(params.get_param('sdv_marble_receive.slow_run_seconds', 0) or 0)
+        level = logging.WARNING if slow_seconds and duration > slow_seconds else logging.INFO
+        _logger.log(
+            level,
+            "Recepción por piezas %s (%s): %s piezas, %s medidas, %s productos nuevos en %.3fs "
+            "(%s consultas) | %s",
+            self.names, self.mode, pieces, groups, products_created, duration, queries,
+            ", ".join("%s %.3fs/%sq" % (name, d, q) for name, (d, q) in self.phases.items()),
+        )
+
+        if params.get_param('sdv_marble_receive.log_runs'):
+            self.env['sdv.marble.receive.run'].sudo().create({
+                'picking_id': self.pickings[:1].id,
+                'mode': self.mode,
+                'piece_count': pieces,
+                'group_count': groups,
+                'products_created': products_created,
+                'duration': duration,
+                'query_count': queries,
+                'phase_ids': [(0, 0, {
+                    'name': name,
+                    'duration': d,
+                    'query_count': q,
+                }) for name, (d, q) in self.phases.items()],
+            })
+
+
+class MarbleReceiveRun(models.Model):
+    _name = 'sdv.marble.receive.run'
+    _description = 'Ejecución de recepción por piezas'
+    _order = 'id desc'
+    _rec_name = 'picking_id'
+
+    picking_id = fields.Many2one('stock.picking', string='Recepción', index=True, ondelete='set null')
+    company_id = fields.Many2one(related='picking_id.company_id', store=True)
+    mode = fields.Selection([
+        ('sync', 'Inmediata'),
+        ('async', 'Segundo plano'),
+    ], string='Modo', required=True, default='sync')
+    piece_count = fields.Integer(string='Piezas', aggregator='sum')
+    group_count = fields.Integer(string='Medidas', aggregator='sum')
+    products_created = fields.Integer(string='Productos nuevos', aggregator='sum')
+    duration = fields.Float(string='Duración (s)', digits=(10, 3), aggregator='avg')
+    query_count = fields.Integer(string='Consultas SQL', aggregator='avg')
+    phase_ids = fields.One2many('sdv.marble.receive.run.phase', 'run_id', string='Fases')
+
+    @api.autovacuum
+    def _gc_old_runs(self):
+        days = int(self.env['ir.config_parameter'].sudo().get_param('sdv_marble_receive.run_retention_days', 90))
+        self.search([('create_date', '<', fields.Datetime.subtract(fields.Datetime.now(), days=days))]).unlink()
+
+
+class MarbleReceiveRunPhase(models.Model):
+    _name = 'sdv.marble.receive.run.phase'
+    _description = 'Fase de una recepción por piezas'
+    _order = 'id'
+
+    run_id = fields.Many2one('sdv.marble.receive.run', required=True, index=True, ondelete='cascade')
+    picking_id = fields.Many2one(related='run_id.picking_id', store=True)
+    name = fields.Char(string='Fase', required=True, index=True)
+    duration = fields.Float(string='Duración (s)', digits=(10, 3), aggregator='avg')
+    query_count = fields.Integer(string='Consultas SQL', aggregator='avg')
@@ -0,0 +1,127 @@
+from odoo import models, fields, api, tools
+
+from .stock_m2_report import piece_measures_sql
+
+
+class MarbleSlab(models.Model):
+    """
+    Índice de las piezas en stock (quants internos de productos hijo y de lotes por pieza)
+    con sus medidas normalizadas: ``w_max`` es el lado mayor y ``w_min`` el menor, de modo
+    que una pieza admite un corte W×H, girado o no, si ``w_max >= max(W, H)`` y
+    ``w_min >= min(W, H)``. Con el índice (grosor, w_min, w_max, área) la mejor pieza se
+    resuelve en una consulta. Se actualiza por producto al validar movimientos de stock.
+    """
+    _name = 'sdv.marble.slab'
+    _description = 'Pieza en stock (índice de medidas)'
+    _order = 'area, id'
+    _rec_name = 'product_id'
+    _log_access = False
+
+    quant_id = fields.Many2one('stock.quant', string='Quant', readonly=True, ondelete='cascade')
+    product_id = fields.Many2one('product.product', string='Producto', readonly=True, index=True, ondelete='cascade')
+    base_tmpl_id = fields.Many2one('product.template', string='Producto base', readonly=True)
+    lot_id = fields.Many2one('stock.lot', string='Lote', readonly=True)
+    location_id = fields.Many2one('stock.location', string='Ubicación', readonly=True)
+    company_id = fields.Many2one('res.company', string='Compañía', readonly=True)
+    quantity = fields.Float(string='Piezas', readonly=True)
+    ancho = fields.Float(string='Ancho (cm)', digits=(10, 2), readonly=True)
+    alto = fields.Float(string='Alto (cm)', digits=(10, 2), readonly=True)
+    grosor = fields.Float(string='Grosor (cm)', digits=(10, 2), readonly=True)
+    w_max = fields.Float(string='Lado mayor (cm)', digits=(10, 2), readonly=True)
+    w_min = fields.Float(string='Lado menor (cm)', digits=(10, 2), readonly=True)
+    area = fields.Float(string='m²', digits=(16, 4), readonly=True)
+
+    def init(self):
+        tools.create_index(
+            self.env.cr, 'sdv_marble_slab_fit_index', self._table, ['grosor', 'w_min', 'w_max', 'area'],
+        )
+        self._refresh()
+
+    # ----------------- Mantenimiento del índice -----------------
+
+    def _refresh(self, products=None):
+        """
+        Recalcula las piezas de ``products`` (todas si es None) a partir de los quants:
+        un DELETE y un INSERT ... SELECT, sin pasar por el ORM.
+        """
+        for model in ('stock.quant', 'stock.lot', 'product.product', 'product.template'):
+            self.env[model].flush_model()
+        ancho, alto, grosor = piece_measures_sql(self.env.cr)
+        where, params = "", []
+        if products is not None:
+            if not products:
+                return
+            where, params = "AND q.product_id IN %s", [tuple(products.ids)]
+            self.env.cr.execute("DELETE FROM sdv_marble_slab WHERE product_id IN %s", params)
+        else:
+            self.env.cr.execute("DELETE FROM sdv_marble_slab")
+        self.env.cr.execute("""
+            INSERT INTO sdv_marble_slab (
+                quant_id, product_id, base_tmpl_id, lot_id, location_id, company_id,
+                quantity, ancho, alto, grosor, w_max, w_min, area
+            )
+            SELECT q.id, q.product_id, COALESCE(tmpl.x_measure_base_tmpl_id, tmpl.id), q.lot_id,
+                   q.location_id, q.company_id,
+                   -- En modo lote la cantidad va en la UoM del producto base: un lote es una pieza
+                   CASE WHEN tmpl.x_receive_mode = 'lot' THEN 1 ELSE q.quantity END,
+                   m.ancho, m.alto, m.grosor,
+                   GREATEST(m.ancho, m.alto), LEAST(m.ancho, m.alto), m.ancho * m.alto / 10000.0
+            FROM stock_quant q
+            JOIN stock_location loc ON loc.id = q.location_id
+            JOIN product_product prod ON prod.id = q.product_id
+            JOIN product_template tmpl ON tmpl.id = prod.product_tmpl_id
+            LEFT JOIN stock_lot lot ON lot.id = q.lot_id
+            CROSS JOIN LATERAL (
+                SELECT ROUND((%s)::numeric, 2) AS ancho,
+                       ROUND((%s)::numeric, 2) AS alto,
+                       ROUND((%s)::numeric, 2) AS grosor
+            ) m
+            WHERE loc.usage = 'internal'
+              AND q.quantity > 0
+              AND m.ancho > 0 AND m.alto > 0
+              AND (tmpl.x_measure_base_tmpl_id IS NOT NULL
+                   OR (tmpl.x_receive_mode = 'lot' AND q.lot_id IS NOT NULL))
+              %s
+        """ % (ancho, alto, grosor, where), params)
+        self.invalidate_model()
+
+    @api.model
+    def _refresh_products(self, products):
+        """Actualiza el índice para los productos hijo o en modo lote de ``products``."""
+        products = products.filtered(
+            lambda p: p.product_tmpl_id.x_measure_base_tmpl_id or p.product_tmpl_id.x_receive_mode == 'lot'
+        )
+        if products:
+            self.sudo()._refresh(products)
+
+    # ----------------- Búsqueda -----------------
+
+    @api.model
+    def _get_fit_domain(self, width, height, thickness, location=None, base_tmpl=None):
+        domain = [
+            ('grosor', '=', round(thickness or 0.0, 2)),
+            ('w_max', '>=', round(max(width, height), 2)),
+            ('w_min', '>=', round(min(width, height), 2)),
+            ('company_id', 'in', self.env.companies.ids),
+        ]
+        if location:
+            domain.append(('location_id', 'child_of', location.ids))
+        if base_tmpl:
+            domain.append(('base_tmpl_id', 'in', base_tmpl.ids))
+        return domain
+
+    @api.model
+    def find_fitting(self, width, height, thickness, location=None, base_tmpl=None, limit=None):
+        """
+        Piezas en stock en las que cabe un corte de ``width`` × ``height`` cm (en cualquier
+        orientación) con grosor ``thickness``, de menor a mayor superficie.
+
+        :param location: stock.location opcional; incluye sus ubicaciones hijas
+        :param base_tmpl: product.template base opcional para limitar el material
+        """
+        return self.search(self._get_fit_domain(width, height, thickness, location, base_tmpl), limit=limit)
+
+    @api.model
+    def find_best_fit(self, width, height, thickness, location=None, base_tmpl=None):
+        """La pieza más pequeña en la que cabe el corte, o un recordset vacío."""
+        return self.find_fitting(width, height, thickness, location=location, base_tmpl=base_tmpl, limit=1)
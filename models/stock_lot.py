@@ -0,0 +1,22 @@
+from odoo import models, fields, api
+
+
+class StockLot(models.Model):
+    _inherit = 'stock.lot'
+
+    # Medidas de la pieza cuando el producto base se recibe en modo "lote por pieza"
+    x_ancho = fields.Float(string='Ancho (cm)', digits=(10, 2))
+    x_alto = fields.Float(string='Alto (cm)', digits=(10, 2))
+    x_grosor = fields.Float(string='Grosor (cm)', digits=(10, 2))
+    x_m2 = fields.Float(string='m²', compute='_compute_x_m2', store=True, digits=(10, 4))
+
+    def write(self, vals):
+        res = super().write(vals)
+        if {'x_ancho', 'x_alto', 'x_grosor'} & set(vals):
+            self.env['sdv.marble.slab']._refresh_products(self.product_id)
+        return res
+
+    @api.depends('x_ancho', 'x_alto')
+    def _compute_x_m2(self):
+        for lot in self:
+            lot.x_m2 = (lot.x_ancho or 0.0) * (lot.x_alto or 0.0) / 10000.0
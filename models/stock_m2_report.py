@@ -0,0 +1,108 @@
+from odoo import models, fields, tools
+
+
+def piece_measures_sql(cr):
+    """
+    Expresiones SQL de ancho, alto y grosor de una pieza de un quant, con las tablas
+    ``tmpl`` (product_template) y ``lot`` (stock_lot) en el FROM. Las medidas de los
+    hijos están en la plantilla si el módulo de medidas las define; en modo lote, en el lote.
+    """
+    if tools.column_exists(cr, 'product_template', 'x_ancho'):
+        child = ('tmpl.x_ancho', 'tmpl.x_alto', 'tmpl.x_grosor')
+    else:
+        child = ('0', '0', '0')
+    return tuple(
+        "CASE WHEN tmpl.x_receive_mode = 'lot' THEN COALESCE(lot.%s, 0) ELSE COALESCE(%s, 0) END" % (lot_field, expr)
+        for lot_field, expr in zip(('x_ancho', 'x_alto', 'x_grosor'), child)
+    )
+
+
+class MarbleStockM2Report(models.Model):
+    """
+    Stock en m² agregado por producto base: suma los quants internos de los productos
+    hijo (una medida por producto) y de los lotes por pieza (medidas en el lote).
+    Es una vista SQL, siempre al día, sobre la que los cuadros de compras y ventas
+    hacen ``read_group`` sin recorrer los productos hijo en Python.
+    """
+    _name = 'sdv.marble.stock.m2.report'
+    _description = 'Stock en m² por producto base'
+    _auto = False
+    _rec_name = 'base_tmpl_id'
+    _order = 'base_tmpl_id, location_id, grosor'
+
+    base_tmpl_id = fields.Many2one('product.template', string='Producto base', readonly=True)
+    location_id = fields.Many2one('stock.location', string='Ubicación', readonly=True)
+    warehouse_id = fields.Many2one('stock.warehouse', string='Almacén', readonly=True)
+    company_id = fields.Many2one('res.company', string='Compañía', readonly=True)
+    grosor = fields.Float(string='Grosor (cm)', digits=(10, 2), readonly=True, aggregator=False)
+    piece_count = fields.Integer(string='Piezas', readonly=True, aggregator='sum')
+    m2_total = fields.Float(string='m²', digits=(16, 4), readonly=True, aggregator='sum')
+    # m² / piezas; al agrupar se recalcula con los totales del grupo (ver _read_group)
+    m2_avg = fields.Float(string='m² medio por pieza', digits=(16, 4), readonly=True, aggregator='avg')
+
+    def _query(self):
+        ancho, alto, grosor = piece_measures_sql(self.env.cr)
+        return """
+            SELECT
+                MIN(q.id) AS id,
+                COALESCE(tmpl.x_measure_base_tmpl_id, tmpl.id) AS base_tmpl_id,
+                q.location_id AS location_id,
+                loc.warehouse_id AS warehouse_id,
+                q.company_id AS company_id,
+                ROUND((%(grosor)s)::numeric, 2) AS grosor,
+                ROUND(SUM(piece.qty))::integer AS piece_count,
+                SUM(piece.m2) AS m2_total,
+                SUM(piece.m2) / NULLIF(SUM(piece.qty), 0) AS m2_avg
+            FROM stock_quant q
+            JOIN stock_location loc ON loc.id = q.location_id
+            JOIN product_product prod ON prod.id = q.product_id
+            JOIN product_template tmpl ON tmpl.id = prod.product_tmpl_id
+            LEFT JOIN stock_lot lot ON lot.id = q.lot_id
+            -- Hijos: cantidad en unidades, una pieza por unidad. Lote por pieza: la cantidad
+            -- va en la UoM del producto base (m² normalmente), así que cuenta una pieza por
+            -- lote en stock y sus m² son los del lote.
+            CROSS JOIN LATERAL (
+                SELECT
+                    CASE WHEN tmpl.x_receive_mode = 'lot'
+                         THEN CASE WHEN q.quantity > 0 THEN 1 ELSE 0 END
+                         ELSE q.quantity END AS qty,
+                    CASE WHEN tmpl.x_receive_mode = 'lot'
+                         THEN CASE WHEN q.quantity > 0 THEN COALESCE(lot.x_m2, 0) ELSE 0 END
+                         ELSE q.quantity * (%(ancho)s) * (%(alto)s) / 10000.0 END AS m2
+            ) piece
+            WHERE loc.usage = 'internal'
+              AND (tmpl.x_measure_base_tmpl_id IS NOT NULL
+                   OR (tmpl.x_receive_mode = 'lot' AND q.lot_id IS NOT NULL))
+            GROUP BY
+                COALESCE(tmpl.x_measure_base_tmpl_id, tmpl.id),
+                q.location_id,
+                loc.warehouse_id,
+                q.company_id,
+                ROUND((%(grosor)s)::numeric, 2)
+        """ % {'ancho': ancho, 'alto': alto, 'grosor': grosor}
+
+    def _read_group(self, domain, groupby=(), aggregates=(), having=(), offset=0, limit=None, order=None):
+        """
+        La media de ``m2_avg`` por grupo sería una media de medias: se sustituye por
+        ``m2_total / piece_count`` del grupo, que es la media real por pieza.
+        """
+        aggregates = list(aggregates)
+        avg_indexes = [i for i, spec in enumerate(aggregates) if spec.split(':')[0] == 'm2_avg']
+        if not avg_indexes:
+            return super()._read_group(domain, groupby, aggregates, having, offset, limit, order)
+
+        rows = super()._read_group(
+            domain, groupby, aggregates + ['m2_total:sum', 'piece_count:sum'], having, offset, limit, order,
+        )
+        result = []
+        for row in rows:
+            *values, m2_total, piece_count = row
+            m2_avg = (m2_total or 0.0) / piece_count if piece_count else 0.0
+            for index in avg_indexes:
+                values[len(groupby) + index] = m2_avg
+            result.append(tuple(values))
+        return result
+
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute("CREATE OR REPLACE VIEW %s AS (%s)" % (self._table, self._query()))
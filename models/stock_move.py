@@ -1,17 +1,51 @@
 from odoo import models, api
 
+# Contexto que envía el selector de líneas del asistente de recepción por piezas
+MOVE_DISPLAY_CONTEXT_KEY = 'sdv_marble_move_display'
+
+
+def _get_product_labels(products):
+    """'[Referencia] Nombre' de todos los productos, leídos en una sola consulta."""
+    products.fetch(['default_code', 'name'])
+    return {
+        product.id: f"[{product.default_code}] {product.name}" if product.default_code else product.name
+        for product in products
+    }
+
+
 class StockMoveInherit(models.Model):
     _inherit = 'stock.move'
 
-    def name_get(self):
-        result = []
+    def _action_done(self, cancel_backorder=False):
+        moves = super()._action_done(cancel_backorder=cancel_backorder)
+        # Índice de piezas en stock: solo se recalculan los productos movidos
+        self.env['sdv.marble.slab']._refresh_products(moves.product_id)
+        return moves
+
+    @api.depends('product_id', 'origin', 'name')
+    @api.depends_context(MOVE_DISPLAY_CONTEXT_KEY)
+    def _compute_display_name(self):
+        if not self.env.context.get(MOVE_DISPLAY_CONTEXT_KEY):
+            return super()._compute_display_name()
+        labels = _get_product_labels(self.product_id)
         for move in self:
             if move.product_id:
-                # Formato: [Producto] Nombre del movimiento
-                name = f"[{move.product_id}] {move.origin}"
+                # Formato: [Producto] Nombre - Origen del movimiento
+                label = labels[move.product_id.id]
+                move.display_name = f"{label} - {move.origin}" if move.origin else label
             else:
-                name = move.name
-                print("No tiene producto")
-            result.append((move.id, name))
-        return result
+                move.display_name = move.name
+
+
+class StockMoveLineInherit(models.Model):
+    _inherit = 'stock.move.line'
 
+    @api.depends('product_id', 'move_id.origin')
+    @api.depends_context(MOVE_DISPLAY_CONTEXT_KEY)
+    def _compute_display_name(self):
+        if not self.env.context.get(MOVE_DISPLAY_CONTEXT_KEY):
+            return super()._compute_display_name()
+        labels = _get_product_labels(self.product_id)
+        for line in self:
+            label = labels.get(line.product_id.id, '')
+            line.display_name = f"{label} - {line.move_id.origin}" if line.move_id.origin else label
@@ -1,15 +1,141 @@
-from odoo import models
+from collections import defaultdict
+
+from odoo import models, fields, api, Command, _
+from odoo.exceptions import UserError
 
 class StockPicking(models.Model):
     _inherit = 'stock.picking'
 
+    x_receive_job_ids = fields.One2many('sdv.marble.receive.job', 'picking_id', string='Recepciones en segundo plano')
+
+    # Progreso de la última recepción por piezas en segundo plano
+    x_receive_job_state = fields.Selection(
+        related='x_receive_job_id.state', string='Estado recepción por piezas',
+    )
+    x_receive_job_id = fields.Many2one(
+        'sdv.marble.receive.job', compute='_compute_receive_progress', store=True,
+    )
+    x_receive_groups_total = fields.Integer(compute='_compute_receive_progress', store=True)
+    x_receive_groups_done = fields.Integer(compute='_compute_receive_progress', store=True)
+    x_receive_pieces_created = fields.Integer(compute='_compute_receive_progress', store=True)
+    x_receive_error = fields.Text(related='x_receive_job_id.error_message')
+
+    @api.depends('x_receive_job_ids.groups_done', 'x_receive_job_ids.pieces_created', 'x_receive_job_ids.state')
+    def _compute_receive_progress(self):
+        for picking in self:
+            job = picking.x_receive_job_ids.sorted('id')[-1:]
+            picking.x_receive_job_id = job
+            picking.x_receive_groups_total = job.groups_total
+            picking.x_receive_groups_done = job.groups_done
+            picking.x_receive_pieces_created = job.pieces_created
+
+    # Resumen agregado de la recepción; se recalcula solo cuando cambian sus movimientos
+    x_receive_summary = fields.Text(
+        string='Resumen recepción por piezas', compute='_compute_receive_summary', store=True,
+    )
+    x_m2_received = fields.Float(
+        string='m² recibidos', compute='_compute_receive_summary', store=True, digits=(10, 4),
+    )
+
+    @api.depends(
+        'move_ids.product_id', 'move_ids.product_uom_qty', 'move_ids.quantity',
+        'move_ids.state', 'move_ids.move_line_ids.lot_id', 'move_ids.move_line_ids.quantity',
+        'move_ids.move_line_ids.lot_id.x_m2',
+    )
+    def _compute_receive_summary(self):
+        summaries = self._get_receive_summary()
+        for picking in self:
+            summary = summaries.get(picking.id)
+            if not summary:
+                picking.x_receive_summary = False
+                picking.x_m2_received = 0.0
+                continue
+
+            txt = [
+                _("%(product)s: planificado %(planned)s %(uom)s | hecho %(done)s %(uom)s",
+                  product=product.display_name, planned=planned, done=done, uom=uom.name)
+                for product, uom, planned, done in summary['moves']
+            ]
+            txt += [
+                _("%(base)s: %(pieces)s piezas, %(m2).2f m²", base=base.display_name, pieces=pieces, m2=m2)
+                for base, (pieces, m2) in summary['bases'].items()
+            ]
+            txt.append(_("Total recibido: %.2f m²") % summary['m2'])
+            picking.x_receive_summary = "\n".join(txt)
+            picking.x_m2_received = summary['m2']
+
+    def _get_receive_summary(self):
+        """
+        Resumen de los movimientos de las recepciones con dos consultas agrupadas en total:
+        planificado/hecho por producto y UoM, piezas y m² por producto base y m² totales.
+        Devuelve {picking_id: {'moves': [(product, uom, planificado, hecho)],
+        'bases': {product.template: (piezas, m²)}, 'm2': float}}.
+        """
+        pickings = self.filtered('id')
+        if not pickings:
+            return {}
+
+        uom_m2 = self.env.ref('uom.uom_square_meter', raise_if_not_found=False)
+        has_measure_fields = {'x_ancho', 'x_alto'} <= set(self.env['product.product']._fields)
+        summaries = defaultdict(lambda: {'moves': [], 'bases': defaultdict(lambda: [0, 0.0]), 'm2': 0.0})
+
+        groups = self.env['stock.move']._read_group(
+            [('picking_id', 'in', pickings.ids), ('state', '!=', 'cancel')],
+            ['picking_id', 'product_id', 'product_uom'],
+            ['product_uom_qty:sum', 'quantity:sum'],
+        )
+        for picking, product, uom, planned, done in groups:
+            summary = summaries[picking.id]
+            summary['moves'].append((product, uom, planned, done))
+            if product.product_tmpl_id.x_receive_mode == 'lot':
+                # Las piezas con lote se suman abajo con los m² de cada lote
+                continue
+            if has_measure_fields and (product.x_ancho or 0.0) > 0 and (product.x_alto or 0.0) > 0:
+                m2 = done * product.x_ancho * product.x_alto / 10000.0
+                base = product.product_tmpl_id.x_measure_base_tmpl_id or product.product_tmpl_id
+                summary['bases'][base][0] += int(done)
+                summary['bases'][base][1] += m2
+            elif uom_m2 and uom.category_id == uom_m2.category_id:
+                m2 = uom._compute_quantity(done, uom_m2)
+            else:
+                m2 = 0.0
+            summary['m2'] += m2
+
+        lot_groups = self.env['stock.move.line']._read_group(
+            [
+                ('picking_id', 'in', pickings.ids),
+                ('state', '!=', 'cancel'),
+                ('lot_id.x_m2', '>', 0),
+                ('quantity', '>', 0),
+                ('product_id.product_tmpl_id.x_receive_mode', '=', 'lot'),
+            ],
+            ['picking_id', 'product_id', 'lot_id'],
+        )
+        for picking, product, lot in lot_groups:
+            summary = summaries[picking.id]
+            summary['bases'][product.product_tmpl_id][0] += 1
+            summary['bases'][product.product_tmpl_id][1] += lot.x_m2
+            summary['m2'] += lot.x_m2
+
+        return summaries
+
     def action_open_marble_receive_wizard(self):
-        self.ensure_one()
+        """Abre el asistente para una recepción o, desde la lista, para varias a la vez."""
+        pickings = self.filtered(lambda p: p.state not in ('cancel', 'done'))
+        if not pickings:
+            raise UserError(_("No hay recepciones abiertas en las que registrar piezas."))
+        context = {'default_picking_id': pickings.id} if len(pickings) == 1 else {
+            'default_picking_ids': [Command.set(pickings.ids)],
+        }
         return {
             'type': 'ir.actions.act_window',
             'name': 'Registrar piezas (mármol)',
             'res_model': 'sdv.marble.receive.wizard',
             'view_mode': 'form',
             'target': 'new',
-            'context': {'default_picking_id': self.id},
+            'context': context,
         }
+
+    def action_retry_marble_receive_job(self):
+        self.ensure_one()
+        self.x_receive_job_id.action_retry()
@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+
+from . import test_receive_api
+from . import test_receive_benchmark
+from . import test_receive_children
+from . import test_receive_concurrency
+from . import test_receive_import
@@ -0,0 +1,50 @@
+from odoo import Command
+
+
+def create_base_product(env, name='Mármol base (test)', **vals):
+    """Producto base almacenable, sin medidas, para recibir por piezas."""
+    return env['product.product'].create({
+        'name': name,
+        'is_storable': True,
+        **vals,
+    })
+
+
+def create_receipt(env, product, quantity=100.0):
+    """Recepción confirmada de ``quantity`` del producto base, con su move line."""
+    picking_type = env.ref('stock.picking_type_in')
+    location = env.ref('stock.stock_location_suppliers')
+    location_dest = picking_type.default_location_dest_id
+    picking = env['stock.picking'].create({
+        'picking_type_id': picking_type.id,
+        'location_id': location.id,
+        'location_dest_id': location_dest.id,
+        'move_ids': [Command.create({
+            'name': product.name,
+            'product_id': product.id,
+            'product_uom_qty': quantity,
+            'product_uom': product.uom_id.id,
+            'location_id': location.id,
+            'location_dest_id': location_dest.id,
+        })],
+    })
+    picking.action_confirm()
+    picking.action_assign()
+    return picking
+
+
+def create_wizard(env, picking, pieces):
+    """
+    Asistente sobre la línea del producto base de la recepción con ``pieces``
+    [(ancho, alto, grosor, piezas)], forzado a generar en la misma transacción.
+    """
+    return env['sdv.marble.receive.wizard'].with_context(sdv_receive_force_sync=True).create({
+        'picking_id': picking.id,
+        'move_id_custom': picking.move_line_ids.filtered('product_id.x_is_base_product')[:1].id,
+        'line_ids': [Command.create({
+            'x_ancho_cm': ancho,
+            'x_alto_cm': alto,
+            'x_grosor_cm': grosor,
+            'x_qty': qty,
+        }) for ancho, alto, grosor, qty in pieces],
+    })
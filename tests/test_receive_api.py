@@ -0,0 +1,44 @@
+from odoo.tests import TransactionCase, tagged
+
+from .common import create_base_product, create_receipt
+
+
+@tagged('post_install', '-at_install')
+class TestReceiveApi(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Job = cls.env['sdv.marble.receive.job']
+        cls.product = create_base_product(cls.env, name='Mármol API (test)')
+        cls.picking = create_receipt(cls.env, cls.product, quantity=100.0)
+        cls.base_move_line = cls.picking.move_line_ids[:1]
+
+    def _ingest(self, batch_ref, pieces):
+        return self.Job.ingest_batch(batch_ref, self.picking.id, self.base_move_line.id, pieces)
+
+    def test_batches_with_the_same_size_keep_both_sets_of_lines(self):
+        size = {'ancho': 300, 'alto': 180, 'grosor': 2}
+        first = self._ingest('test-api-1', [dict(size, qty=2)])
+        second = self._ingest('test-api-2', [dict(size, qty=3)])
+
+        self.assertEqual((first['state'], second['state']), ('done', 'done'))
+        self.assertEqual(first['product_ids'], second['product_ids'])
+        self.assertEqual(len(first['move_line_ids']), 2)
+        self.assertEqual(len(second['move_line_ids']), 3)
+        self.assertFalse(set(first['move_line_ids']) & set(second['move_line_ids']))
+
+        # Las piezas del primer lote siguen en la recepción junto a las del segundo
+        move_lines = self.env['stock.move.line'].browse(first['move_line_ids'] + second['move_line_ids'])
+        self.assertEqual(len(move_lines.exists()), 5)
+        child_move = move_lines.move_id
+        self.assertEqual(len(child_move), 1)
+        self.assertEqual(child_move.move_line_ids, move_lines)
+
+    def test_resending_a_batch_does_not_duplicate_pieces(self):
+        pieces = [{'ancho': 250, 'alto': 150, 'grosor': 3, 'qty': 2}]
+        first = self._ingest('test-api-repeat', pieces)
+        again = self._ingest('test-api-repeat', pieces)
+
+        self.assertEqual(first, again)
+        self.assertEqual(self.Job.search_count([('batch_ref', '=', 'test-api-repeat')]), 1)
@@ -0,0 +1,97 @@
+import logging
+import time
+
+from odoo.models import INSERT_BATCH_SIZE
+from odoo.tests import TransactionCase, tagged
+
+from .common import create_base_product, create_receipt, create_wizard
+
+_logger = logging.getLogger(__name__)
+
+# Piezas x medidas distintas de cada escenario
+SCENARIOS = [
+    (pieces, sizes)
+    for pieces in (10, 100, 1000)
+    for sizes in (1, 20, 200)
+    if sizes <= pieces
+]
+
+# Consultas SQL de una generación en el escenario de referencia (10 piezas, 1 medida)
+REFERENCE_MAX_QUERIES = {True: 90, False: 130}
+# El ORM inserta de INSERT_BATCH_SIZE en INSERT_BATCH_SIZE filas: cada bloque adicional
+# de move lines (1 por pieza) o de hijos / moves (1 por medida) añade sus INSERT y las
+# escrituras diferidas de ese bloque. Fuera de eso las consultas no crecen ni con las
+# piezas ni con las medidas: un N+1 de cualquiera de ellas supera el presupuesto.
+QUERIES_PER_PIECES_BATCH = 5
+QUERIES_PER_SIZES_BATCH = {True: 10, False: 30}
+
+
+def _batches(count):
+    return -(-count // INSERT_BATCH_SIZE)
+
+
+@tagged('post_install', '-at_install', 'benchmark')
+class TestReceiveBenchmark(TransactionCase):
+    """
+    Consultas SQL y tiempo de ``action_generate_pieces`` para 10/100/1000 piezas en
+    1/20/200 medidas, con los productos hijo ya creados y sin ellos. Cada escenario
+    se registra en el log (consultas y segundos) para ajustar los presupuestos.
+    """
+
+    def _prepare_scenario(self, pieces, sizes, existing_children):
+        product = create_base_product(
+            self.env, name='Benchmark %s/%s/%s' % (pieces, sizes, existing_children),
+        )
+        picking = create_receipt(self.env, product, quantity=pieces)
+        measures = [(200.0 + i, 150.0, 2.0) for i in range(sizes)]
+        quantities = [pieces // sizes + (1 if i < pieces % sizes else 0) for i in range(sizes)]
+        if existing_children:
+            self.env['sdv.marble.receive.wizard']._resolve_children(product, measures)
+        wizard = create_wizard(self.env, picking, [
+            (ancho, alto, grosor, qty) for (ancho, alto, grosor), qty in zip(measures, quantities)
+        ])
+        self.env.flush_all()
+        self.env.invalidate_all()
+        return wizard
+
+    def _measure(self, wizard):
+        """(consultas, segundos) de una generación, incluidas las escrituras diferidas."""
+        start_queries = self.env.cr.sql_log_count
+        start = time.perf_counter()
+        wizard.action_generate_pieces()
+        self.env.flush_all()
+        return self.env.cr.sql_log_count - start_queries, time.perf_counter() - start
+
+    def _get_budget(self, reference, pieces, sizes, existing_children):
+        return (
+            reference
+            + QUERIES_PER_PIECES_BATCH * (_batches(pieces) - 1)
+            + QUERIES_PER_SIZES_BATCH[existing_children] * (_batches(sizes) - 1)
+        )
+
+    def _check_scenarios(self, existing_children):
+        # El primer uso llena cachés del registro (ormcache, referencias...): no cuenta
+        self._measure(self._prepare_scenario(10, 1, existing_children))
+        reference, duration = self._measure(self._prepare_scenario(10, 1, existing_children))
+        _logger.info(
+            "Benchmark recepción (hijos existentes: %s) referencia 10 piezas / 1 medida: %s consultas, %.3fs",
+            existing_children, reference, duration,
+        )
+        self.assertLessEqual(reference, REFERENCE_MAX_QUERIES[existing_children])
+
+        for pieces, sizes in SCENARIOS:
+            with self.subTest(pieces=pieces, sizes=sizes):
+                queries, duration = self._measure(self._prepare_scenario(pieces, sizes, existing_children))
+                budget = self._get_budget(reference, pieces, sizes, existing_children)
+                _logger.info(
+                    "Benchmark recepción (hijos existentes: %s) %s piezas / %s medidas: "
+                    "%s consultas (máximo %s), %.3fs",
+                    existing_children, pieces, sizes, queries, budget, duration,
+                )
+                self.assertLessEqual(queries, budget)
+
+    def test_queries_with_existing_children(self):
+        self._check_scenarios(existing_children=True)
+
+    def test_queries_with_new_children(self):
+        self._check_scenarios(existing_children=False)
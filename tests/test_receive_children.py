@@ -0,0 +1,38 @@
+from odoo import Command
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestReceiveChildren(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Wizard = cls.env['sdv.marble.receive.wizard']
+        attribute = cls.env['product.attribute'].create({
+            'name': 'Acabado (test)',
+            'create_variant': 'always',
+            'value_ids': [Command.create({'name': 'Pulido'}), Command.create({'name': 'Apomazado'})],
+        })
+        cls.base_tmpl = cls.env['product.template'].create({
+            'name': 'Mármol con acabados (test)',
+            'is_storable': True,
+            'attribute_line_ids': [Command.create({
+                'attribute_id': attribute.id,
+                'value_ids': [Command.set(attribute.value_ids.ids)],
+            })],
+        })
+        cls.polished, cls.honed = cls.base_tmpl.product_variant_ids
+
+    def test_second_finish_with_the_same_size_gets_its_own_variant(self):
+        measures = (300.0, 180.0, 2.0)
+        polished_child = self.Wizard._resolve_children(self.polished, [measures])[measures]
+        honed_child = self.Wizard._resolve_children(self.honed, [measures])[measures]
+
+        self.assertEqual(polished_child.product_tmpl_id, honed_child.product_tmpl_id)
+        self.assertNotEqual(polished_child, honed_child)
+        for base, child in ((self.polished, polished_child), (self.honed, honed_child)):
+            self.assertEqual(
+                child.product_template_attribute_value_ids.product_attribute_value_id,
+                base.product_template_attribute_value_ids.product_attribute_value_id,
+            )
@@ -0,0 +1,98 @@
+from odoo import api, SUPERUSER_ID
+from odoo.exceptions import ConcurrencyError
+from odoo.modules.registry import Registry
+from odoo.service.model import retrying
+from odoo.tests import tagged
+from odoo.tests.common import BaseCase, get_db_name
+
+from .common import create_base_product, create_receipt, create_wizard
+
+SIZE = (301.0, 181.0, 2.0, 1)
+
+
+@tagged('post_install', '-at_install')
+class TestReceiveConcurrency(BaseCase):
+    """
+    Dos recepciones en cursores distintos crean a la vez el mismo producto hijo. Los
+    datos se confirman de verdad (cada cursor debe ver lo que confirma el otro), así
+    que la prueba los borra al terminar.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.registry = Registry(get_db_name())
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            product = create_base_product(env, name='Mármol concurrencia (test)')
+            picking = create_receipt(env, product)
+            self.base_tmpl_id = product.product_tmpl_id.id
+            self.picking_id = picking.id
+        self.addCleanup(self._cleanup)
+
+    def _cleanup(self):
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            picking = env['stock.picking'].browse(self.picking_id)
+            picking.action_cancel()
+            picking.unlink()
+            templates = env['product.template'].with_context(active_test=False).search([
+                ('x_measure_base_tmpl_id', '=', self.base_tmpl_id),
+            ])
+            (templates | templates.browse(self.base_tmpl_id)).unlink()
+
+    def _generate(self, cr):
+        env = api.Environment(cr, SUPERUSER_ID, {})
+        picking = env['stock.picking'].browse(self.picking_id)
+        create_wizard(env, picking, [SIZE]).action_generate_pieces()
+
+    def _assert_single_child_two_pieces(self):
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            children = env['product.template'].with_context(active_test=False).search([
+                ('x_measure_base_tmpl_id', '=', self.base_tmpl_id),
+            ])
+            self.assertEqual(len(children), 1, "Solo debe existir un producto hijo por medida")
+            move_lines = env['stock.move.line'].search([
+                ('picking_id', '=', self.picking_id),
+                ('product_id', 'in', children.product_variant_ids.ids),
+            ])
+            self.assertEqual(len(move_lines), 2, "Las dos recepciones deben registrar su pieza")
+
+    def test_same_new_size_from_two_cursors(self):
+        with self.registry.cursor() as cr_a, self.registry.cursor() as cr_b:
+            # B toma su instantánea antes de que A cree y confirme el hijo
+            cr_b.execute("SELECT id FROM stock_picking WHERE id = %s", [self.picking_id])
+
+            self._generate(cr_a)
+            cr_a.commit()
+
+            # El hijo de A no es visible para B: la clave única choca y B debe reintentar
+            with self.assertRaises(ConcurrencyError):
+                self._generate(cr_b)
+            cr_b.rollback()
+
+            # El reintento (nueva transacción, como hace Odoo) reutiliza el hijo de A
+            self._generate(cr_b)
+            cr_b.commit()
+
+        self._assert_single_child_two_pieces()
+
+    def test_retrying_recovers_from_conflict(self):
+        attempts = []
+
+        def generate():
+            attempts.append(True)
+            self._generate(cr_b)
+
+        with self.registry.cursor() as cr_a, self.registry.cursor() as cr_b:
+            cr_b.execute("SELECT id FROM stock_picking WHERE id = %s", [self.picking_id])
+
+            self._generate(cr_a)
+            cr_a.commit()
+
+            # El bucle de reintentos de Odoo deshace el primer intento y repite la recepción
+            retrying(generate, api.Environment(cr_b, SUPERUSER_ID, {}))
+            cr_b.commit()
+
+        self.assertEqual(len(attempts), 2, "El conflicto debe resolverse en un único reintento")
+        self._assert_single_child_two_pieces()
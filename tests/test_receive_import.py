@@ -0,0 +1,62 @@
+from odoo.exceptions import UserError
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestReceiveImport(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Wizard = cls.env['sdv.marble.receive.wizard']
+
+    def _wizard(self, **vals):
+        return self.Wizard.new(dict({
+            'import_has_header': True,
+            'import_delimiter': ';',
+            'import_col_ancho': 'ancho',
+            'import_col_alto': 'alto',
+            'import_col_grosor': 'grosor',
+            'import_col_qty': 'piezas',
+        }, **vals))
+
+    def test_parse_number_formats(self):
+        parse = self.Wizard._parse_import_number
+        self.assertEqual(parse('1.234,5'), 1234.5)
+        self.assertEqual(parse('1,234.5'), 1234.5)
+        self.assertEqual(parse('12,5'), 12.5)
+        self.assertEqual(parse(' 300 '), 300.0)
+        self.assertEqual(parse(2), 2.0)
+        self.assertEqual(parse(''), 0.0)
+        with self.assertRaises(ValueError):
+            parse('abc')
+
+    def test_parse_packing_list_rows(self):
+        data = "\n".join([
+            "ancho;alto;grosor;piezas",
+            "300;180;2;2",
+            "300,0;180;2;1",
+            "250;150;3;1,5",
+            "250;150",
+            "0;150;3;1",
+            ";;;",
+        ]).encode()
+        groups, errors = self._wizard()._parse_packing_list(data)
+
+        self.assertEqual(dict(groups), {(300.0, 180.0, 2.0): 3})
+        self.assertEqual(len(errors), 3)
+        # Cantidad no entera, fila corta y medida a 0
+        self.assertEqual([error.split(':')[0] for error in errors], ["Fila 4", "Fila 5", "Fila 6"])
+
+    def test_numbered_columns_without_header(self):
+        wizard = self._wizard(
+            import_has_header=False, import_delimiter=',',
+            import_col_ancho='1', import_col_alto='2', import_col_grosor='3', import_col_qty='4',
+        )
+        groups, errors = wizard._parse_packing_list(b'"1,234.5",180,2,1\n')
+        self.assertEqual(dict(groups), {(1234.5, 180.0, 2.0): 1})
+        self.assertFalse(errors)
+
+    def test_column_zero_is_rejected(self):
+        with self.assertRaises(UserError):
+            self._wizard()._resolve_import_column('0', None)
@@ -1,22 +1,53 @@
-from odoo import models, fields, api, _
-from odoo.exceptions import UserError, ValidationError
+import base64
+import csv
+import io
+from collections import Counter, defaultdict
+
+from psycopg2.errors import UniqueViolation
+
+from odoo import models, fields, api, Command, _
+from odoo.exceptions import ConcurrencyError, UserError, ValidationError
+
+from ..models.child_cache import cache_children_after_commit, get_child_cache
+from ..models.receive_run import ReceiveInstrumentation, receive_count, receive_phase, INSTRUMENTATION_CONTEXT_KEY
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
 
 MEASURE_KEYS = ('x_ancho_cm', 'x_alto_cm', 'x_grosor_cm')
 
+# Piezas a partir de las cuales la generación se lanza en segundo plano
+# (parámetro de sistema ``sdv_marble_receive.async_piece_threshold``; 0 lo desactiva)
+ASYNC_PIECE_THRESHOLD = 500
+
+# Máximo de errores de fila que se muestran al importar un packing list
+IMPORT_MAX_ERRORS = 50
+
 
 class MarbleReceiveWizard(models.TransientModel):
     _name = 'sdv.marble.receive.wizard'
     _description = 'Recepción de Mármol por Piezas'
 
-    picking_id = fields.Many2one('stock.picking', required=True)
+    picking_id = fields.Many2one('stock.picking')
+    # Recepción conjunta de varias recepciones (p. ej. un camión con varios pedidos)
+    picking_ids = fields.Many2many('stock.picking', string='Recepciones')
     line_ids = fields.One2many('sdv.marble.receive.line', 'wizard_id', string='Piezas')
 
     last_x_ancho_cm = fields.Float(string='Últ. ancho (cm)', readonly=True)
     last_x_alto_cm = fields.Float(string='Últ. alto (cm)', readonly=True)
     last_x_grosor_cm = fields.Float(string='Últ. grosor (cm)', readonly=True)
 
+    run_async = fields.Boolean(
+        string='Procesar en segundo plano',
+        help="Genera las piezas por bloques en una tarea programada. Se activa automáticamente "
+             "en recepciones grandes.",
+    )
+    duplicate_count = fields.Integer(string='Nº de copias', default=1)
+
     m2_total_calculated = fields.Float(string='m² totales (calculados)', compute='_compute_totals', store=False)
-    moves_info = fields.Char(string='Resumen movimientos', compute='_compute_moves_info', store=False)
+    moves_info = fields.Text(string='Resumen movimientos', compute='_compute_moves_info', store=False)
 
     # Línea concreta de la recepción sobre la que vamos a registrar las piezas
     move_id_custom = fields.Many2one(
@@ -25,6 +56,26 @@ class MarbleReceiveWizard(models.TransientModel):
         help="Elemento de la recepción sobre el que se registrarán las piezas.",
     )
 
+    # Importación de packing list (CSV / XLSX)
+    import_file = fields.Binary(string='Packing list', attachment=False)
+    import_filename = fields.Char(string='Nombre del fichero')
+    import_has_header = fields.Boolean(string='Primera fila con cabeceras', default=True)
+    import_delimiter = fields.Selection(
+        [(';', 'Punto y coma (;)'), (',', 'Coma (,)'), ('\t', 'Tabulador')],
+        string='Separador CSV',
+        default=';',
+    )
+    import_col_ancho = fields.Char(
+        string='Columna ancho', default='ancho',
+        help="Nombre de la cabecera o número de columna (empezando en 1).",
+    )
+    import_col_alto = fields.Char(string='Columna alto', default='alto')
+    import_col_grosor = fields.Char(string='Columna grosor', default='grosor')
+    import_col_qty = fields.Char(
+        string='Columna cantidad', default='cantidad',
+        help="Opcional. Si no existe la columna, cada fila cuenta como una pieza.",
+    )
+
     # IDs de move lines disponibles para el dominio (solo productos base)
     available_move_line_ids = fields.Many2many(
         'stock.move.line',
@@ -33,51 +84,48 @@ class MarbleReceiveWizard(models.TransientModel):
     )
 
     # ----------------- Computes -----------------
-    @api.depends('picking_id', 'picking_id.move_line_ids', 'picking_id.move_line_ids.state')
+    @api.depends(
+        'picking_id', 'picking_id.move_line_ids', 'picking_id.move_line_ids.state',
+        'picking_ids', 'picking_ids.move_line_ids', 'picking_ids.move_line_ids.state',
+    )
     def _compute_available_move_line_ids(self):
+        MoveLine = self.env['stock.move.line']
         for wiz in self:
-            if not wiz.picking_id:
+            if not wiz._get_pickings():
                 wiz.available_move_line_ids = False
                 continue
 
-            # Filtrar solo las move lines de productos "base" (sin medidas)
-            move_lines = wiz.picking_id.move_line_ids.filtered(
-                lambda ml: ml.state not in ('cancel', 'done') and wiz._is_base_product(ml.product_id)
-            )
-            wiz.available_move_line_ids = move_lines
+            # Solo las move lines de productos "base" (sin medidas), en una única búsqueda
+            wiz.available_move_line_ids = MoveLine.search(wiz._get_available_move_line_domain())
 
-    def _is_base_product(self, product):
-        """
-        Determina si un producto es un producto "base" (padre) o uno generado con medidas.
-        Un producto base NO tiene medidas establecidas (x_ancho, x_alto, x_grosor son 0 o no existen).
-        """
-        if 'x_ancho' not in product._fields:
-            return True
-
-        ancho = product.x_ancho or 0.0
-        alto = product.x_alto or 0.0
-        grosor = product.x_grosor or 0.0
+    def _get_pickings(self):
+        self.ensure_one()
+        return self.picking_id | self.picking_ids
 
-        # Si todas las medidas son 0, es un producto base
-        return ancho <= 0 and alto <= 0 and grosor <= 0
+    def _get_available_move_line_domain(self):
+        self.ensure_one()
+        return [
+            ('picking_id', 'in', self._get_pickings().ids),
+            ('state', 'not in', ('cancel', 'done')),
+            ('product_id.x_is_base_product', '=', True),
+        ]
 
-    @api.depends('line_ids.x_ancho_cm', 'line_ids.x_alto_cm')
+    @api.depends('line_ids.m2')
     def _compute_totals(self):
         for wiz in self:
             wiz.m2_total_calculated = sum(l.m2 for l in wiz.line_ids)
 
-    @api.depends('picking_id.move_ids_without_package.move_line_ids.qty_done')
+    @api.depends('picking_id.x_receive_summary', 'picking_ids.x_receive_summary')
     def _compute_moves_info(self):
         for wiz in self:
-            txt = []
-            for m in wiz.picking_id.move_ids_without_package:
-                qty_done = sum(ml.qty_done for ml in m.move_line_ids) if m.move_line_ids else 0.0
-                txt.append(
-                    f"{m.product_id.display_name}: "
-                    f"planificado {m.product_uom_qty} {m.product_uom.name} | "
-                    f"hecho {qty_done} {m.product_uom.name}"
+            pickings = wiz._get_pickings()
+            if len(pickings) == 1:
+                wiz.moves_info = pickings.x_receive_summary
+            else:
+                wiz.moves_info = "\n\n".join(
+                    f"{picking.name}\n{picking.x_receive_summary}"
+                    for picking in pickings if picking.x_receive_summary
                 )
-            wiz.moves_info = " | ".join(txt)
 
     # ----------------- Helpers -----------------
     def _get_expected_product_name(self, base_name, ancho_cm, alto_cm, grosor_cm):
@@ -90,109 +138,144 @@ class MarbleReceiveWizard(models.TransientModel):
 
         return f"{base_name} – {fmt(ancho_cm)}x{fmt(alto_cm)}x{fmt(grosor_cm)} cm"
 
-    def _find_existing_child(self, base_product, ancho_cm, alto_cm, grosor_cm):
-        Product = self.env['product.product']
+    def _find_existing_children(self, base_product, measures):
+        """
+        Resuelve de una vez los productos hijo ya existentes de ``base_product`` para
+        todas las medidas pedidas, usando la clave de medidas indexada de la plantilla.
+        Devuelve un dict {(ancho, alto, grosor): product.product}; las medidas sin hijo
+        no aparecen. Los hijos archivados se reactivan.
+
+        Los hijos ya resueltos se sirven desde la caché LRU del proceso
+        (ver ``models/child_cache.py``); solo las medidas no cacheadas van a la tabla.
+        """
+        ProductT = self.env['product.template'].with_context(active_test=False)
         base_tmpl = base_product.product_tmpl_id
 
-        ancho_cm = round(ancho_cm, 2)
-        alto_cm = round(alto_cm, 2)
-        grosor_cm = round(grosor_cm, 2)
+        measures_by_key = {}
+        for ancho_cm, alto_cm, grosor_cm in measures:
+            key = base_tmpl._get_child_measure_key(ancho_cm, alto_cm, grosor_cm)
+            measures_by_key[key] = (round(ancho_cm, 2), round(alto_cm, 2), round(grosor_cm, 2))
+        if not measures_by_key:
+            return {}
 
-        expected_name = self._get_expected_product_name(base_tmpl.name, ancho_cm, alto_cm, grosor_cm)
+        # Caché: (compañía, producto base, clave de medidas) -> id del hijo
+        cache_keys = {
+            (base_tmpl.company_id.id, base_product.id, key): key for key in measures_by_key
+        }
+        cached = get_child_cache(self.env).get_many(self.env, list(cache_keys))
+        # Sin consulta de validación: la secuencia de invalidación garantiza que siguen activos
+        cached_products = {product.id: product for product in self.env['product.product'].browse(cached.values())}
+        children = {
+            measures_by_key[cache_keys[cache_key]]: cached_products[product_id]
+            for cache_key, product_id in cached.items()
+        }
+        if len(children) == len(measures_by_key):
+            return children
+
+        templates_by_measures = {}
+        pending_keys = [key for key in measures_by_key if measures_by_key[key] not in children]
+        for tmpl in ProductT.search([('x_measure_key', 'in', pending_keys)]):
+            templates_by_measures[measures_by_key[tmpl.x_measure_key]] = tmpl
+
+        to_activate = self.env['product.product']
+        for key_measures, tmpl in templates_by_measures.items():
+            product = self._select_child_variant(base_product, tmpl)
+            if not product:
+                continue
+            if not product.active:
+                to_activate |= product
+            children[key_measures] = product
+
+        if to_activate:
+            to_activate.product_tmpl_id.filtered(lambda t: not t.active).write({'active': True})
+            to_activate.filtered(lambda p: not p.active).write({'active': True})
+
+        key_by_measures = {m: key for key, m in measures_by_key.items()}
+        cache_children_after_commit(self.env, {
+            (base_tmpl.company_id.id, base_product.id, key_by_measures[m]): product.id
+            for m, product in children.items()
+        })
+        return children
 
-        products = Product.with_context(active_test=False).search([
-            ('name', '=', expected_name),
-            ('company_id', '=', base_tmpl.company_id.id),
-        ])
-        if not products:
-            return False
+    def _get_child_ptav_ids(self, base_product, child_tmpl):
+        """
+        Valores de atributo del hijo equivalentes a los del producto base. Si el base usa un
+        valor que la línea de atributo del hijo aún no tiene, se añade a esa línea.
+        """
+        values = base_product.product_template_attribute_value_ids.product_attribute_value_id
+        lines_by_attribute = {line.attribute_id: line for line in child_tmpl.attribute_line_ids}
+        for value in values:
+            line = lines_by_attribute.get(value.attribute_id)
+            if line and value not in line.value_ids:
+                line.write({'value_ids': [Command.link(value.id)]})
+
+        ptav_by_value = {
+            ptav.product_attribute_value_id.id: ptav.id
+            for ptav in child_tmpl.attribute_line_ids.product_template_value_ids
+        }
+        if any(value.id not in ptav_by_value for value in values):
+            raise UserError(_(
+                "No se pudieron mapear los atributos del producto '%s' al template '%s'."
+            ) % (base_product.display_name, child_tmpl.display_name))
+        return [ptav_by_value[value.id] for value in values]
 
-        fields_pp = Product._fields
-        has_measure_fields = {'x_ancho', 'x_alto', 'x_grosor'} <= set(fields_pp.keys())
-
-        for product in products:
-            if has_measure_fields:
-                product_ancho = round(product.x_ancho or 0.0, 2)
-                product_alto = round(product.x_alto or 0.0, 2)
-                product_grosor = round(product.x_grosor or 0.0, 2)
-
-                if (product_ancho == ancho_cm and
-                        product_alto == alto_cm and
-                        product_grosor == grosor_cm):
-                    if not product.active:
-                        product.active = True
-                    return product
-            else:
-                if not product.active:
-                    product.active = True
-                return product
-
-        return False
-
-    def _ensure_component_with_measures(self, tmpl, ancho_cm, alto_cm, grosor_cm):
-        vals = {}
-        has_flag = 'x_b_es_componente' in tmpl._fields
-        has_ancho = 'x_ancho' in tmpl._fields
-        has_alto = 'x_alto' in tmpl._fields
-        has_grosor = 'x_grosor' in tmpl._fields
-
-        if has_ancho and (tmpl.x_ancho or 0.0) <= 0 and (ancho_cm or 0.0) > 0:
-            vals['x_ancho'] = ancho_cm
-        if has_alto and (tmpl.x_alto or 0.0) <= 0 and (alto_cm or 0.0) > 0:
-            vals['x_alto'] = alto_cm
-        if has_grosor and (tmpl.x_grosor or 0.0) <= 0:
-            if (grosor_cm or 0.0) <= 0:
-                raise ValidationError(_(
-                    "Para marcar el producto '%s' como componente, debes indicar un Grosor (cm) > 0."
-                ) % (tmpl.display_name,))
-            vals['x_grosor'] = grosor_cm
-
-        if vals:
-            tmpl.with_context(skip_measure_validation=True).write(vals)
-
-        if has_flag and not tmpl.x_b_es_componente:
-            tmpl.with_context(skip_measure_validation=True).write({'x_b_es_componente': True})
+    def _prepare_child_variant_vals(self, base_product, child_tmpl, ptav_ids):
+        return {
+            'product_tmpl_id': child_tmpl.id,
+            'product_template_attribute_value_ids': [(6, 0, ptav_ids)],
+            'standard_price': base_product.standard_price,
+            'default_code': base_product.default_code,
+        }
 
-    def _create_child_product(self, base_product, ancho_cm, alto_cm, grosor_cm):
+    def _select_child_variant(self, base_product, child_tmpl):
         """
-        Crea un nuevo product.template con el nombre maquetado con medidas y los MISMOS
-        atributos que el producto base (en modo dinámico no se crean variantes automáticamente).
-        Luego crea explícitamente el product.product con la combinación específica de atributos.
+        Variante del hijo con los mismos valores de atributo que el producto base. La clave
+        de medidas es única por template, así que si otra variante del base (otro acabado)
+        llega con las mismas medidas, su variante se crea en el template hijo existente.
         """
-        ProductT = self.env['product.template']
-        ProductP = self.env['product.product']
-        base_tmpl = base_product.product_tmpl_id
+        variants = child_tmpl.with_context(active_test=False).product_variant_ids
+        if not base_product.product_template_attribute_value_ids:
+            return variants[:1]
+        ptav_ids = self._get_child_ptav_ids(base_product, child_tmpl)
+        for variant in variants:
+            if set(variant.product_template_attribute_value_ids.ids) == set(ptav_ids):
+                return variant
+        # Atributos en modo "siempre": añadir el valor a la línea ya ha creado la variante
+        for variant in child_tmpl.with_context(active_test=False).product_variant_ids - variants:
+            if set(variant.product_template_attribute_value_ids.ids) == set(ptav_ids):
+                return variant
+        return self.env['product.product'].with_context(
+            skip_measure_validation=True,
+            create_product_product=True,
+        ).create(self._prepare_child_variant_vals(base_product, child_tmpl, ptav_ids))
 
-        ancho_cm = round(ancho_cm, 2)
-        alto_cm = round(alto_cm, 2)
-        grosor_cm = round(grosor_cm, 2)
+    def _find_existing_child(self, base_product, ancho_cm, alto_cm, grosor_cm):
+        measures = (round(ancho_cm, 2), round(alto_cm, 2), round(grosor_cm, 2))
+        return self._find_existing_children(base_product, [measures]).get(measures, False)
 
-        # === UoM PARA MOVIMIENTOS: SIEMPRE UNIDADES ===
+    def _get_uom_unit(self):
         uom_unit = self.env.ref('uom.product_uom_unit', raise_if_not_found=False)
-
         if not uom_unit:
             uom_unit = self.env['uom.uom'].search([('uom_type', '=', 'reference')], limit=1)
         if not uom_unit:
             raise UserError(_("No se encontró una unidad de medida de tipo 'Unidad'."))
+        return uom_unit
 
-        print("Unidad de medida: " + str(uom_unit.name))
+    def _prepare_child_template_vals(self, base_product, ancho_cm, alto_cm, grosor_cm):
+        """
+        Valores de creación del product.template hijo: nombre maquetado con medidas, los
+        MISMOS atributos que el producto base, precios, UoM comerciales y marca de componente.
+        """
+        base_tmpl = base_product.product_tmpl_id
+        fields_tmpl = base_tmpl._fields
 
         # === UoM COMERCIALES (solo información, no stock) ===
         uom_sale_original = base_tmpl.uom_id
         uom_purchase_original = base_tmpl.uom_po_id or uom_sale_original
 
-        print("Unidad de medida original: " + str(uom_sale_original.name))
-        print("Unidad de medida compra original: " + str(uom_purchase_original.name))
-
-
-        # Nombre del template con medidas
-        template_name_with_measures = self._get_expected_product_name(
-            base_tmpl.name, ancho_cm, alto_cm, grosor_cm
-        )
-
-        # === CREAR TEMPLATE HIJO (stock SIEMPRE en unidades) ===
+        # === TEMPLATE HIJO (stock SIEMPRE en unidades) ===
         vals_tmpl = {
-            'name': template_name_with_measures,
+            'name': self._get_expected_product_name(base_tmpl.name, ancho_cm, alto_cm, grosor_cm),
             'type': 'consu',
             'is_storable': True,
             'categ_id': base_tmpl.categ_id.id,
@@ -203,187 +286,403 @@ class MarbleReceiveWizard(models.TransientModel):
             'sale_ok': base_tmpl.sale_ok,
         }
 
-        # Medidas
+        # Clave de medidas indexada para la búsqueda de hijos existentes
+        vals_tmpl['x_measure_base_tmpl_id'] = base_tmpl.id
+        vals_tmpl['x_measure_key'] = base_tmpl._get_child_measure_key(ancho_cm, alto_cm, grosor_cm)
+
+        # Medidas y marca de componente
+        if 'x_grosor' in fields_tmpl and (grosor_cm or 0.0) <= 0:
+            raise ValidationError(_(
+                "Para marcar el producto '%s' como componente, debes indicar un Grosor (cm) > 0."
+            ) % (vals_tmpl['name'],))
         for f, v in (('x_ancho', ancho_cm), ('x_alto', alto_cm), ('x_grosor', grosor_cm)):
-            if f in base_tmpl._fields:
+            if f in fields_tmpl:
                 vals_tmpl[f] = v
 
-        if 'x_b_es_componente' in base_tmpl._fields:
+        if 'x_b_es_componente' in fields_tmpl:
             vals_tmpl['x_b_es_componente'] = True
 
-        # Atributos completos del template padre
+        # Herencia del precio del template padre: los extras de atributo los suma cada variante
+        if 'list_price' in fields_tmpl:
+            vals_tmpl['list_price'] = base_tmpl.list_price
+
+        # Atributos completos del template padre; sin atributos, el template crea su
+        # única variante y le traslada coste y SKU.
         if base_tmpl.attribute_line_ids:
-            attr_cmds = []
-            for attr_line in base_tmpl.attribute_line_ids:
-                attr_cmds.append((0, 0, {
-                    'attribute_id': attr_line.attribute_id.id,
-                    'value_ids': [(6, 0, attr_line.value_ids.ids)],
-                }))
-            vals_tmpl['attribute_line_ids'] = attr_cmds
-
-        # Crear el product.template hijo
-        child_tmpl = ProductT.with_context(skip_measure_validation=True).create(vals_tmpl)
-
-        # Herencia de precios base
-        if 'standard_price' in child_tmpl._fields:
-            child_tmpl.standard_price = base_tmpl.standard_price
-        if 'list_price' in child_tmpl._fields:
-            child_tmpl.list_price = base_tmpl.list_price
+            vals_tmpl['attribute_line_ids'] = [(0, 0, {
+                'attribute_id': attr_line.attribute_id.id,
+                'value_ids': [(6, 0, attr_line.value_ids.ids)],
+            }) for attr_line in base_tmpl.attribute_line_ids]
+        else:
+            if 'standard_price' in fields_tmpl:
+                vals_tmpl['standard_price'] = base_product.standard_price
+            if base_product.default_code:
+                vals_tmpl['default_code'] = base_product.default_code
 
-        # Tarifas de proveedor
-        for seller in base_tmpl.seller_ids:
-            seller.copy({'product_tmpl_id': child_tmpl.id})
+        # === INFO COMERCIAL DE UoM ORIGINAL (si existen campos) ===
+        if 'x_uom_sale' in fields_tmpl:
+            vals_tmpl['x_uom_sale'] = uom_sale_original.id
+        if 'x_uom_purchase' in fields_tmpl:
+            vals_tmpl['x_uom_purchase'] = uom_purchase_original.id
 
-        # === CREAR LA VARIANTE (product.product) ===
-        ptavs = base_product.product_template_attribute_value_ids
-        if ptavs:
-            new_ptav_ids = []
-            for ptav in ptavs:
-                matching_line = child_tmpl.attribute_line_ids.filtered(
-                    lambda l: l.attribute_id.id == ptav.attribute_id.id
-                )
-                if matching_line:
-                    matching_ptav = matching_line.product_template_value_ids.filtered(
-                        lambda v: v.product_attribute_value_id.id == ptav.product_attribute_value_id.id
-                    )
-                    if matching_ptav:
-                        new_ptav_ids.append(matching_ptav[0].id)
-
-            if not new_ptav_ids:
-                raise UserError(_(
-                    "No se pudieron mapear los atributos del producto '%s' al nuevo template."
-                ) % base_product.display_name)
-
-            child_product = ProductP.with_context(
-                skip_measure_validation=True,
-                create_product_product=True,
-            ).create({
-                'product_tmpl_id': child_tmpl.id,
-                'product_template_attribute_value_ids': [(6, 0, new_ptav_ids)],
-            })
-        else:
-            child_product = child_tmpl.product_variant_id
+        return vals_tmpl
 
-        # Heredar precios del product.product padre
-        if 'standard_price' in child_product._fields:
-            child_product.standard_price = base_product.standard_price
-        if 'lst_price' in child_product._fields:
-            child_product.lst_price = base_product.lst_price
+    def _create_child_products(self, base_product, measures):
+        """
+        Crea en bloque los productos hijo de ``base_product`` para todas las medidas dadas:
+        un único ``create`` para los templates, otro para las variantes (cuando el base tiene
+        atributos; en modo dinámico no se crean variantes automáticamente) y otro para las
+        tarifas de proveedor. Devuelve un dict {(ancho, alto, grosor): product.product}.
+        """
+        ProductT = self.env['product.template'].with_context(skip_measure_validation=True)
+        ProductP = self.env['product.product'].with_context(
+            skip_measure_validation=True,
+            create_product_product=True,
+        )
+        base_tmpl = base_product.product_tmpl_id
 
-        # Copiar SKU
-        if 'default_code' in child_product._fields and base_product.default_code:
-            child_product.default_code = base_product.default_code
+        measures = [(round(a, 2), round(b, 2), round(g, 2)) for a, b, g in measures]
+        if not measures:
+            return {}
 
-        # Marcar como componente con medidas
-        self._ensure_component_with_measures(child_tmpl, ancho_cm, alto_cm, grosor_cm)
+        # === CREAR TEMPLATES HIJO ===
+        with receive_phase(self.env, 'create_templates'):
+            child_tmpls = ProductT.create([
+                self._prepare_child_template_vals(base_product, *m) for m in measures
+            ])
 
-        # === GUARDAR INFO COMERCIAL DE UoM ORIGINAL (si existen campos) ===
-        if 'x_uom_sale' in child_tmpl._fields:
-            child_tmpl.x_uom_sale = uom_sale_original.id
+        # Tarifas de proveedor
+        with receive_phase(self.env, 'supplierinfo'):
+            seller_vals = base_tmpl.seller_ids.copy_data()
+            if seller_vals:
+                self.env['product.supplierinfo'].create([
+                    dict(vals, product_tmpl_id=child_tmpl.id)
+                    for child_tmpl in child_tmpls
+                    for vals in seller_vals
+                ])
+
+        # === VARIANTES (product.product) ===
+        ptavs = base_product.product_template_attribute_value_ids
+        if not ptavs:
+            return {m: child_tmpl.product_variant_id for m, child_tmpl in zip(measures, child_tmpls)}
+
+        with receive_phase(self.env, 'create_variants'):
+            children = {}
+            variant_vals = []
+            variant_measures = []
+            for m, child_tmpl in zip(measures, child_tmpls):
+                new_ptav_ids = self._get_child_ptav_ids(base_product, child_tmpl)
+
+                # Atributos en modo "siempre": la combinación ya existe como variante
+                existing = child_tmpl.product_variant_ids.filtered(
+                    lambda p: set(p.product_template_attribute_value_ids.ids) == set(new_ptav_ids)
+                )[:1]
+                if existing:
+                    existing.write({
+                        'standard_price': base_product.standard_price,
+                        'default_code': base_product.default_code,
+                    })
+                    children[m] = existing
+                    continue
+
+                variant_vals.append(self._prepare_child_variant_vals(base_product, child_tmpl, new_ptav_ids))
+                variant_measures.append(m)
+
+            if variant_vals:
+                children.update(zip(variant_measures, ProductP.create(variant_vals)))
+        return children
+
+    def _resolve_children(self, base_product, measures):
+        """
+        Devuelve {(ancho, alto, grosor): product.product} para todas las medidas,
+        reutilizando los hijos existentes y creando en bloque los que falten.
 
-        if 'x_uom_purchase' in child_tmpl._fields:
-            child_tmpl.x_uom_purchase = uom_purchase_original.id
+        La unicidad de la clave de medidas la garantiza la base de datos: si otra
+        recepción concurrente crea la misma medida, la creación en bloque se deshace
+        (savepoint) y las medidas se resuelven una a una. Solo esperan entre sí las
+        recepciones que crean la misma medida, sin bloqueo global.
+        """
+        with receive_phase(self.env, 'lookup'):
+            children = self._find_existing_children(base_product, measures)
+        missing = [m for m in measures if m not in children]
+        if not missing:
+            return children
+
+        # Los productos creados se cuentan al salir del savepoint: un bloque deshecho no cuenta
+        try:
+            with self.env.cr.savepoint():
+                created = self._create_child_products(base_product, missing)
+        except UniqueViolation:
+            pass
+        else:
+            receive_count(self.env, 'products_created', len(created))
+            children.update(created)
+            return children
+
+        for measure in missing:
+            try:
+                with self.env.cr.savepoint():
+                    created = self._create_child_products(base_product, [measure])
+            except UniqueViolation:
+                existing = self._find_existing_children(base_product, [measure])
+                if not existing:
+                    # El hijo lo ha confirmado otra transacción después de empezar la nuestra
+                    # y no es visible en esta instantánea: Odoo reintenta la petición entera.
+                    raise ConcurrencyError(
+                        "Producto hijo %s creado por una recepción concurrente" % (measure,)
+                    )
+                children.update(existing)
+            else:
+                receive_count(self.env, 'products_created', len(created))
+                children.update(created)
+        return children
 
-        return child_product
+    def _create_child_product(self, base_product, ancho_cm, alto_cm, grosor_cm):
+        measures = (round(ancho_cm, 2), round(alto_cm, 2), round(grosor_cm, 2))
+        return self._create_child_products(base_product, [measures])[measures]
 
-    def action_generate_pieces(self):
-        self.ensure_one()
-        picking = self.picking_id
+    def _prepare_child_move_vals(self, picking, base_move, child, quantity, uom_unit):
+        return {
+            'name': child.display_name,
+            'product_id': child.id,
+            'product_uom_qty': quantity,
+            'product_uom': uom_unit.id,
+            'picking_id': picking.id,
+            'company_id': picking.company_id.id,
+            'location_id': base_move.location_id.id,
+            'location_dest_id': base_move.location_dest_id.id,
+            'state': 'draft',
+            'purchase_line_id': base_move.purchase_line_id.id
+            if 'purchase_line_id' in base_move._fields else False,
+            'origin': base_move.origin or picking.name,
+        }
 
-        if not self.line_ids:
-            raise UserError(_("Debes añadir al menos una pieza."))
+    def _prepare_child_move_line_vals(self, picking, child_move, uom_unit):
+        return {
+            'move_id': child_move.id,
+            'picking_id': picking.id,
+            'product_id': child_move.product_id.id,
+            'product_uom_id': uom_unit.id,
+            'location_id': child_move.location_id.id,
+            'location_dest_id': child_move.location_dest_id.id,
+            'quantity': 1.0,
+        }
 
-        if not self.move_id_custom:
-            raise UserError(_("Debes seleccionar la línea de recepción sobre la que registrar las piezas."))
+    def _generate_child_moves(self, picking, base_move, children, quantities):
+        """
+        Registra las piezas en los moves de los productos hijo del picking.
 
-        # Trabajamos A PARTIR DE LA LÍNEA DE MOVIMIENTO SELECCIONADA
-        base_move_line = self.move_id_custom  # stock.move.line
-        base_move = base_move_line.move_id  # stock.move asociado
+        :param children: {(ancho, alto, grosor): product.product}
+        :param quantities: {(ancho, alto, grosor): número de piezas}
+        :return: las stock.move.line creadas
+        """
+        return self._generate_child_moves_batch([(picking, base_move, children, quantities)])
 
-        if not base_move:
-            raise UserError(_("La línea seleccionada no tiene un movimiento asociado."))
+    def _generate_child_moves_batch(self, targets):
+        """
+        Registra en bloque las piezas de varios moves base, aunque sean de recepciones
+        distintas: una búsqueda de los moves hijo abiertos, un ``create`` para los moves
+        que falten, otro para todas las move lines (1 por pieza) y una única confirmación.
 
+        :param targets: lista de (picking, move base, {medidas: hijo}, {medidas: piezas})
+        :return: las stock.move.line creadas
+        """
         StockMove = self.env['stock.move']
         StockMoveLine = self.env['stock.move.line']
-
-        # Agrupar líneas del asistente por medidas
-        lines_by_measures = {}
+        uom_unit = self._get_uom_unit()
+
+        # Demanda por (picking, hijo): varios moves base pueden compartir el mismo hijo
+        demand = {}
+        for picking, base_move, children, quantities in targets:
+            for measures, quantity in quantities.items():
+                key = (picking.id, children[measures].id)
+                if key in demand:
+                    demand[key][0] += quantity
+                else:
+                    demand[key] = [quantity, picking, base_move, children[measures]]
+
+        # 2) Moves abiertos de los pickings para los hijos, en una sola búsqueda
+        with receive_phase(self.env, 'moves'):
+            open_moves = StockMove.search([
+                ('picking_id', 'in', list({key[0] for key in demand})),
+                ('product_id', 'in', list({key[1] for key in demand})),
+                ('state', 'not in', ('cancel', 'done')),
+            ], order='id')
+            move_by_key = {}
+            for move in open_moves:
+                move_by_key.setdefault((move.picking_id.id, move.product_id.id), move)
+            # Las move lines que ya tienen son piezas de recepciones anteriores: se conservan
+            piece_line_ids = set(open_moves.move_line_ids.ids)
+
+            child_moves = StockMove
+            new_move_vals = []
+            for key, (quantity, picking, base_move, child) in demand.items():
+                existing_move = move_by_key.get(key)
+                if existing_move:
+                    # Incrementar la demanda
+                    existing_move.write({'product_uom_qty': existing_move.product_uom_qty + quantity})
+                    child_moves |= existing_move
+                else:
+                    # Nuevo move SIN confirmar todavía
+                    new_move_vals.append(self._prepare_child_move_vals(picking, base_move, child, quantity, uom_unit))
+            if new_move_vals:
+                new_moves = StockMove.create(new_move_vals)
+                move_by_key.update(((move.picking_id.id, move.product_id.id), move) for move in new_moves)
+                child_moves |= new_moves
+
+            # 3) ELIMINAR las move lines automáticas que Odoo haya creado en esta llamada
+            auto_lines = child_moves.move_line_ids.filtered(lambda l: l.id not in piece_line_ids)
+            if auto_lines:
+                auto_lines.unlink()
+
+        # 4) Crear las move lines manualmente (1 por pieza) en un único create
+        with receive_phase(self.env, 'move_lines'):
+            move_line_vals = []
+            for picking, base_move, children, quantities in targets:
+                for measures, quantity in quantities.items():
+                    child_move = move_by_key[(picking.id, children[measures].id)]
+                    vals = self._prepare_child_move_line_vals(picking, child_move, uom_unit)
+                    move_line_vals.extend(dict(vals) for _i in range(int(quantity)))
+            move_lines = StockMoveLine.create(move_line_vals)
+
+        # 5) Confirmar de una vez los moves en draft
+        with receive_phase(self.env, 'confirm'):
+            draft_moves = child_moves.filtered(lambda m: m.state == 'draft')
+            if draft_moves:
+                draft_moves._action_confirm()
+
+        return move_lines
+
+    def _get_quantities_by_target(self):
+        """
+        Piezas del asistente agrupadas por línea de recepción destino y por medidas:
+        {stock.move.line base: Counter {(ancho, alto, grosor): piezas}}. Las líneas sin
+        destino propio van a la línea de recepción seleccionada en el asistente.
+        """
+        self.ensure_one()
+        quantities_by_target = defaultdict(Counter)
         for line in self.line_ids:
             ancho = round(line.x_ancho_cm or 0.0, 2)
             alto = round(line.x_alto_cm or 0.0, 2)
             grosor = round(line.x_grosor_cm or 0.0, 2)
             if ancho <= 0 or alto <= 0 or grosor <= 0:
                 raise ValidationError(_("Todas las piezas deben tener Ancho, Alto y Grosor > 0."))
-            key = (ancho, alto, grosor)
-            lines_by_measures.setdefault(key, []).append(line)
+            if line.x_qty <= 0:
+                raise ValidationError(_("El número de piezas de cada línea debe ser mayor que 0."))
+            target = line.move_line_id or self.move_id_custom
+            if not target:
+                raise UserError(_("Debes seleccionar la línea de recepción sobre la que registrar las piezas."))
+            quantities_by_target[target][(ancho, alto, grosor)] += line.x_qty
+        return quantities_by_target
+
+    def _generate_pieces(self, picking, base_move, base_product, quantities):
+        """
+        Genera las piezas de ``quantities`` ({(ancho, alto, grosor): piezas}) sobre el
+        move base: resuelve o crea los productos hijo y registra sus moves y move lines.
+        Devuelve las stock.move.line creadas.
+        """
+        if base_product.x_receive_mode == 'lot':
+            return self._generate_lot_pieces(picking, base_move, quantities)
 
-        base_product = base_move_line.product_id
+        # 1) Buscar los hijos existentes en una sola consulta y crear en bloque los que falten
+        children = self._resolve_children(base_product, list(quantities))
 
-        # UoM Unidad
-        uom_unit = self.env.ref('uom.product_uom_unit', raise_if_not_found=False)
-        if not uom_unit:
-            uom_unit = self.env['uom.uom'].search([('uom_type', '=', 'reference')], limit=1)
-        if not uom_unit:
-            raise UserError(_("No se encontró una unidad de medida de tipo 'Unidad'."))
+        # 2) a 5) Moves y move lines de los hijos en bloque
+        return self._generate_child_moves(picking, base_move, children, quantities)
 
-        total_pieces_created = len(self.line_ids)
+    def _generate_pieces_batch(self, quantities_by_target):
+        """
+        Genera de una vez las piezas de varias líneas de recepción, de uno o varios
+        pickings. Los productos hijo se resuelven una sola vez por producto base para
+        todo el lote y moves y move lines se crean en bloque.
 
-        for (ancho, alto, grosor), lines_group in lines_by_measures.items():
-            # 1) Buscar / crear producto hijo
-            child = self._find_existing_child(base_product, ancho, alto, grosor)
-            if not child:
-                child = self._create_child_product(base_product, ancho, alto, grosor)
+        :param quantities_by_target: {stock.move.line base: {(ancho, alto, grosor): piezas}}
+        :return: las stock.move.line creadas
+        """
+        move_lines = self.env['stock.move.line']
+        child_targets = []
+        measures_by_product = defaultdict(set)
+        for target, quantities in quantities_by_target.items():
+            if target.product_id.x_receive_mode == 'lot':
+                move_lines |= self._generate_lot_pieces(target.move_id.picking_id, target.move_id, quantities)
+            else:
+                child_targets.append((target, quantities))
+                measures_by_product[target.product_id].update(quantities)
 
-            quantity = len(lines_group)
+        # 1) Hijos compartidos por todo el lote: una resolución por producto base
+        children_by_product = {
+            product: self._resolve_children(product, sorted(measures))
+            for product, measures in measures_by_product.items()
+        }
 
-            # 2) Buscar move existente del mismo picking + producto hijo
-            existing_move = StockMove.search([
-                ('picking_id', '=', picking.id),
-                ('product_id', '=', child.id),
-                ('state', 'not in', ('cancel', 'done')),
-            ], limit=1)
+        # 2) a 5) Moves y move lines de todos los pickings en bloque
+        if child_targets:
+            move_lines |= self._generate_child_moves_batch([
+                (target.move_id.picking_id, target.move_id, children_by_product[target.product_id], quantities)
+                for target, quantities in child_targets
+            ])
+        return move_lines
 
-            if existing_move:
-                child_move = existing_move
-                # Incrementar la demanda
-                new_demand = child_move.product_uom_qty + quantity
-                child_move.write({'product_uom_qty': new_demand})
-            else:
-                # Crear nuevo move SIN confirmar todavía
-                child_move = StockMove.create({
-                    'name': child.display_name,
-                    'product_id': child.id,
-                    'product_uom_qty': quantity,
-                    'product_uom': uom_unit.id,
-                    'picking_id': picking.id,
-                    'company_id': picking.company_id.id,
-                    'location_id': base_move.location_id.id,
-                    'location_dest_id': base_move.location_dest_id.id,
-                    'state': 'draft',
-                    'purchase_line_id': base_move.purchase_line_id.id
-                    if 'purchase_line_id' in base_move._fields else False,
-                    'origin': base_move.origin or picking.name,
-                })
-
-            # 3) ELIMINAR cualquier move line automática que Odoo haya creado
-            if child_move.move_line_ids:
-                child_move.move_line_ids.unlink()
-
-            # 4) Crear las move lines manualmente (1 por pieza)
-            for line in lines_group:
-                StockMoveLine.create({
-                    'move_id': child_move.id,
-                    'picking_id': picking.id,
-                    'product_id': child.id,
-                    'product_uom_id': uom_unit.id,
-                    'location_id': child_move.location_id.id,
-                    'location_dest_id': child_move.location_dest_id.id,
-                    'quantity': 1.0,
-                })
-
-            # 5) Confirmar el move si está en draft
-            if child_move.state == 'draft':
-                child_move._action_confirm()
+    def _get_piece_quantity(self, base_move, ancho_cm, alto_cm):
+        """
+        Cantidad de una pieza en la UoM del move base: sus m² si el producto se mide
+        en superficie, 1 unidad en cualquier otro caso.
+        """
+        uom = base_move.product_uom
+        uom_m2 = self.env.ref('uom.uom_square_meter', raise_if_not_found=False)
+        if uom_m2 and uom.category_id == uom_m2.category_id:
+            return uom_m2._compute_quantity(ancho_cm * alto_cm / 10000.0, uom)
+        uom_unit = self._get_uom_unit()
+        if uom.category_id == uom_unit.category_id:
+            return uom_unit._compute_quantity(1.0, uom)
+        return 1.0
+
+    def _generate_lot_pieces(self, picking, base_move, quantities):
+        """
+        Modo "lote por pieza": cada pieza es un stock.lot del producto base con sus
+        medidas, registrado en el propio move base. Lotes y move lines se crean en bloque
+        y el catálogo no crece con las medidas distintas.
+        Devuelve las stock.move.line creadas.
+        """
+        base_product = base_move.product_id
+        if base_product.tracking != 'lot':
+            raise UserError(_(
+                "El producto '%s' se recibe con un lote por pieza: debe tener seguimiento por lotes."
+            ) % base_product.display_name)
+
+        with receive_phase(self.env, 'lots'):
+            pieces = [measures for measures, qty in quantities.items() for _i in range(int(qty))]
+            lots = self.env['stock.lot'].create([{
+                'product_id': base_product.id,
+                'company_id': picking.company_id.id,
+                'x_ancho': ancho,
+                'x_alto': alto,
+                'x_grosor': grosor,
+            } for ancho, alto, grosor in pieces])
+
+        with receive_phase(self.env, 'move_lines'):
+            # ELIMINAR las move lines automáticas (sin lote) del move base
+            auto_lines = base_move.move_line_ids.filtered(lambda ml: not ml.lot_id and not ml.lot_name)
+            if auto_lines:
+                auto_lines.unlink()
+
+            piece_qty = {m: self._get_piece_quantity(base_move, m[0], m[1]) for m in quantities}
+            move_lines = self.env['stock.move.line'].create([{
+                'move_id': base_move.id,
+                'picking_id': picking.id,
+                'product_id': base_product.id,
+                'product_uom_id': base_move.product_uom.id,
+                'lot_id': lot.id,
+                'location_id': base_move.location_id.id,
+                'location_dest_id': base_move.location_dest_id.id,
+                'quantity': piece_qty[measures],
+            } for lot, measures in zip(lots, pieces)])
+        return move_lines
+
+    def _reduce_base_move_demand(self, base_move, total_pieces_created):
+        # En modo "lote por pieza" las piezas se registran en el propio move base
+        if base_move.product_id.x_receive_mode == 'lot':
+            return
 
         # REDUCIR la demanda del movimiento base en lugar de cancelarlo directamente
         new_base_qty = base_move.product_uom_qty - total_pieces_created
@@ -401,34 +700,252 @@ class MarbleReceiveWizard(models.TransientModel):
                 if lines_to_remove:
                     lines_to_remove.unlink()
 
+    def _check_generation(self):
+        """Valida el asistente y devuelve las piezas por línea de recepción destino."""
+        self.ensure_one()
+
+        if not self.line_ids:
+            raise UserError(_("Debes añadir al menos una pieza."))
+
+        quantities_by_target = self._get_quantities_by_target()
+
+        # Trabajamos A PARTIR DE LAS LÍNEAS DE MOVIMIENTO SELECCIONADAS
+        pickings = self._get_pickings()
+        for base_move_line in quantities_by_target:
+            if not base_move_line.move_id:
+                raise UserError(_("La línea seleccionada no tiene un movimiento asociado."))
+            if pickings and base_move_line.picking_id not in pickings:
+                raise UserError(_("La línea %s no pertenece a las recepciones del asistente.") % base_move_line.display_name)
+
+        return quantities_by_target
+
+    def _use_async_generation(self, pieces):
+        if self.run_async:
+            return True
+        if self.env.context.get('sdv_receive_force_sync'):
+            return False
+        threshold = int(self.env['ir.config_parameter'].sudo().get_param(
+            'sdv_marble_receive.async_piece_threshold', ASYNC_PIECE_THRESHOLD
+        ))
+        return threshold > 0 and pieces > threshold
+
+    def action_generate_pieces(self):
+        quantities_by_target = self._check_generation()
+        pickings = self.env['stock.picking'].union(*(ml.move_id.picking_id for ml in quantities_by_target))
+        pieces = sum(sum(quantities.values()) for quantities in quantities_by_target.values())
+
+        # Recepciones grandes: se procesan por bloques en segundo plano, una tarea por move
+        # base; las líneas destino del mismo move se agrupan como en la generación inmediata.
+        if self._use_async_generation(pieces):
+            targets_by_move = {}
+            for base_move_line, quantities in quantities_by_target.items():
+                targets_by_move.setdefault(base_move_line.move_id, (base_move_line, Counter()))[1].update(quantities)
+            Job = self.env['sdv.marble.receive.job']
+            for base_move_line, quantities in targets_by_move.values():
+                Job.create_from_quantities(base_move_line, quantities)
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'type': 'info',
+                    'message': _(
+                        "La recepción de %(pieces)s piezas se está procesando en segundo plano. "
+                        "Puedes seguir el progreso en %(pickings)s.",
+                        pieces=pieces, pickings=", ".join(pickings.mapped('name')),
+                    ),
+                    'next': {'type': 'ir.actions.act_window_close'},
+                },
+            }
+
+        instrumentation = ReceiveInstrumentation(self.env, pickings, 'sync')
+        wizard = self.with_context(**{INSTRUMENTATION_CONTEXT_KEY: instrumentation})
+        wizard._generate_pieces_batch(quantities_by_target)
+
+        # Varias líneas pueden pertenecer al mismo move base
+        pieces_by_move = defaultdict(int)
+        for base_move_line, quantities in quantities_by_target.items():
+            pieces_by_move[base_move_line.move_id] += sum(quantities.values())
+        with receive_phase(wizard.env, 'base_move'):
+            for base_move, move_pieces in pieces_by_move.items():
+                wizard._reduce_base_move_demand(base_move, move_pieces)
+
+        instrumentation.finish(
+            pieces=pieces,
+            groups=sum(len(quantities) for quantities in quantities_by_target.values()),
+        )
         return {'type': 'ir.actions.act_window_close'}
 
+    # ---------- Importación de packing list ----------
+    def _iter_packing_list_rows(self, data):
+        """Recorre el fichero fila a fila sin cargarlo entero en estructuras Python."""
+        filename = (self.import_filename or '').lower()
+        if filename.endswith('.xlsx') or data[:2] == b'PK':
+            if openpyxl is None:
+                raise UserError(_("Para importar ficheros XLSX es necesaria la librería openpyxl."))
+            try:
+                workbook = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+            except Exception as e:
+                raise UserError(_("No se pudo leer el fichero XLSX: %s") % e)
+            try:
+                sheet = workbook.worksheets[0]
+                for row in sheet.iter_rows(values_only=True):
+                    yield row
+            finally:
+                workbook.close()
+        else:
+            stream = io.TextIOWrapper(io.BytesIO(data), encoding='utf-8-sig', newline='')
+            try:
+                yield from csv.reader(stream, delimiter=self.import_delimiter or ';')
+            except (csv.Error, UnicodeDecodeError) as e:
+                raise UserError(_("No se pudo leer el fichero CSV: %s") % e)
+
+    def _resolve_import_column(self, spec, header, required=True):
+        """Índice de columna para una cabecera o número (1..n) configurado."""
+        spec = (spec or '').strip()
+        if not spec:
+            if required:
+                raise UserError(_("Configura todas las columnas de medidas del packing list."))
+            return None
+        if spec.isdigit():
+            if int(spec) < 1:
+                raise UserError(_("Las columnas del packing list se numeran desde 1 (columna '%s').") % spec)
+            return int(spec) - 1
+        normalized = [str(h or '').strip().lower() for h in (header or [])]
+        if spec.lower() in normalized:
+            return normalized.index(spec.lower())
+        if required:
+            raise UserError(_("No se encontró la columna '%s' en el packing list.") % spec)
+        return None
+
+    @staticmethod
+    def _parse_import_number(value):
+        if isinstance(value, (int, float)):
+            return float(value)
+        value = str(value or '').strip().replace(' ', '')
+        if not value:
+            return 0.0
+        # Con ambos separadores, el último es el decimal: "1.234,5" y "1,234.5" valen 1234.5
+        if ',' in value and '.' in value:
+            thousands = '.' if value.rfind(',') > value.rfind('.') else ','
+            value = value.replace(thousands, '')
+        return float(value.replace(',', '.'))
+
+    def _parse_packing_list(self, data):
+        """
+        Valida el packing list y lo agrupa por medidas.
+        Devuelve (Counter {(ancho, alto, grosor): piezas}, [errores de fila]).
+        """
+        rows = self._iter_packing_list_rows(data)
+        header = None
+        if self.import_has_header:
+            header = next(rows, None)
+        col_ancho = self._resolve_import_column(self.import_col_ancho, header)
+        col_alto = self._resolve_import_column(self.import_col_alto, header)
+        col_grosor = self._resolve_import_column(self.import_col_grosor, header)
+        col_qty = self._resolve_import_column(self.import_col_qty, header, required=False)
+
+        groups = Counter()
+        errors = []
+        first_row = 2 if self.import_has_header else 1
+        for row_number, row in enumerate(rows, start=first_row):
+            if not row or all(cell in (None, '') or not str(cell).strip() for cell in row):
+                continue
+            try:
+                ancho, alto, grosor = (
+                    round(self._parse_import_number(row[col]), 2)
+                    for col in (col_ancho, col_alto, col_grosor)
+                )
+                qty = 1.0
+                if col_qty is not None and col_qty < len(row) and row[col_qty] not in (None, ''):
+                    qty = self._parse_import_number(row[col_qty])
+            except (IndexError, ValueError):
+                errors.append(_("Fila %s: valores no numéricos o columnas incompletas.") % row_number)
+                continue
+            if ancho <= 0 or alto <= 0 or grosor <= 0:
+                errors.append(_("Fila %s: ancho, alto y grosor deben ser > 0.") % row_number)
+                continue
+            if qty <= 0 or qty != int(qty):
+                errors.append(_("Fila %s: la cantidad debe ser un entero > 0.") % row_number)
+                continue
+            groups[(ancho, alto, grosor)] += int(qty)
+        return groups, errors
+
+    def action_import_packing_list(self):
+        self.ensure_one()
+        if not self.import_file:
+            raise UserError(_("Selecciona primero el fichero del packing list."))
+
+        groups, errors = self._parse_packing_list(base64.b64decode(self.import_file))
+        if errors:
+            shown = errors[:IMPORT_MAX_ERRORS]
+            if len(errors) > IMPORT_MAX_ERRORS:
+                shown.append(_("… y %s errores más.") % (len(errors) - IMPORT_MAX_ERRORS))
+            raise UserError(_("El packing list contiene errores:\n%s") % "\n".join(shown))
+        if not groups:
+            raise UserError(_("El packing list no contiene piezas."))
+
+        self.env['sdv.marble.receive.line'].create([
+            {
+                'wizard_id': self.id,
+                'x_ancho_cm': ancho,
+                'x_alto_cm': alto,
+                'x_grosor_cm': grosor,
+                'x_qty': qty,
+            }
+            for (ancho, alto, grosor), qty in groups.items()
+        ])
+        self.write({'import_file': False, 'import_filename': False})
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': 'sdv.marble.receive.wizard',
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
     # ---------- Duplicado de última línea ----------
-    def _get_last_complete_line_values(self):
+    def _get_last_complete_line(self):
         self.ensure_one()
         for line in reversed(self.line_ids):
-            a, b, g = line.x_ancho_cm or 0.0, line.x_alto_cm or 0.0, line.x_grosor_cm or 0.0
-            if a > 0 and b > 0 and g > 0:
-                return a, b, g
+            if (line.x_ancho_cm or 0.0) > 0 and (line.x_alto_cm or 0.0) > 0 and (line.x_grosor_cm or 0.0) > 0:
+                return line
+        return self.env['sdv.marble.receive.line']
+
+    def _get_last_complete_line_values(self):
+        self.ensure_one()
+        line = self._get_last_complete_line()
+        if line:
+            return line.x_ancho_cm, line.x_alto_cm, line.x_grosor_cm
         a, b, g = self.last_x_ancho_cm or 0.0, self.last_x_alto_cm or 0.0, self.last_x_grosor_cm or 0.0
         if a > 0 and b > 0 and g > 0:
             return a, b, g
         return None
 
     def action_duplicate_last_line(self):
+        """Añade ``duplicate_count`` piezas iguales a la última línea completa."""
         self.ensure_one()
-        vals = self._get_last_complete_line_values()
-        if not vals:
-            raise UserError(_("Edita primero una línea (ancho/alto/grosor > 0) para poder duplicarla."))
-
-        ancho, alto, grosor = vals
-        self.write({
-            'line_ids': [(0, 0, {
-                'x_ancho_cm': ancho,
-                'x_alto_cm': alto,
-                'x_grosor_cm': grosor,
-            })]
-        })
+        copies = self.duplicate_count or 1
+        if copies <= 0:
+            raise UserError(_("El número de copias debe ser mayor que 0."))
+
+        line = self._get_last_complete_line()
+        if line:
+            # Las piezas idénticas se acumulan en la misma línea
+            line.x_qty += copies
+        else:
+            vals = self._get_last_complete_line_values()
+            if not vals:
+                raise UserError(_("Edita primero una línea (ancho/alto/grosor > 0) para poder duplicarla."))
+
+            ancho, alto, grosor = vals
+            self.write({
+                'line_ids': [(0, 0, {
+                    'x_ancho_cm': ancho,
+                    'x_alto_cm': alto,
+                    'x_grosor_cm': grosor,
+                    'x_qty': copies,
+                })]
+            })
         return {
             'type': 'ir.actions.act_window',
             'res_model': 'sdv.marble.receive.wizard',
@@ -443,15 +960,18 @@ class MarbleReceiveLine(models.TransientModel):
     _description = 'Línea de pieza recibida'
 
     wizard_id = fields.Many2one('sdv.marble.receive.wizard', required=True, ondelete='cascade')
+    # Línea de recepción destino; si está vacía se usa la seleccionada en el asistente
+    move_line_id = fields.Many2one('stock.move.line', string='Línea de recepción')
     x_ancho_cm = fields.Float(string='Ancho (cm)', required=True, digits=(10, 2))
     x_alto_cm = fields.Float(string='Alto (cm)', required=True, digits=(10, 2))
     x_grosor_cm = fields.Float(string='Grosor (cm)', required=True, digits=(10, 2))
+    x_qty = fields.Integer(string='Piezas', required=True, default=1)
     m2 = fields.Float(string='m²', compute='_compute_m2', store=False, digits=(10, 4))
 
-    @api.depends('x_ancho_cm', 'x_alto_cm')
+    @api.depends('x_ancho_cm', 'x_alto_cm', 'x_qty')
     def _compute_m2(self):
         for rec in self:
-            rec.m2 = (rec.x_ancho_cm or 0) * (rec.x_alto_cm or 0) / 10000.0
+            rec.m2 = (rec.x_ancho_cm or 0) * (rec.x_alto_cm or 0) * (rec.x_qty or 0) / 10000.0
 
     @api.onchange('x_ancho_cm', 'x_alto_cm', 'x_grosor_cm')
     def _onchange_push_snapshot_to_wizard(self):